@@ -0,0 +1,64 @@
+"""Time converting many small files, as when scanning every mission's
+l10n/DEFAULT/dictionary.
+
+Usage:
+    python benchmarks/bench_batch.py [MIZ_PATH...]
+"""
+
+import os.path
+import sys
+import timeit
+import zipfile
+
+from dcsmissionpy import _parser
+
+_DEFAULT_MIZ = os.path.join(
+    os.path.dirname(__file__), os.pardir, "tests", "harpoon-radar.miz"
+)
+
+_MEMBERS = ["l10n/DEFAULT/dictionary", "l10n/DEFAULT/mapResource"]
+
+
+def _read_members(miz_paths):
+    texts = []
+    for miz_path in miz_paths:
+        with zipfile.ZipFile(miz_path) as z:
+            for member in _MEMBERS:
+                if member in z.namelist():
+                    texts.append(z.read(member).decode("utf-8"))
+    return texts
+
+
+def main():
+    miz_paths = sys.argv[1:] or [_DEFAULT_MIZ]
+    texts = _read_members(miz_paths)
+    # Repeat small inputs so that the timings are meaningful.
+    texts = texts * max(1, 1000 // len(texts))
+
+    def new_engine_per_file():
+        for text in texts:
+            _parser.LuaToPython().lua_to_python(text, engine="antlr")
+
+    def reused_engine():
+        engine = _parser.LuaToPython()
+        for text in texts:
+            engine.lua_to_python(text, engine="antlr")
+
+    def fast_engine():
+        for text in texts:
+            _parser.lua_to_python(text)
+
+    print(f"{len(texts)} files")
+    baseline = None
+    for name, function in [
+        ("antlr, new engine per file", new_engine_per_file),
+        ("antlr, reused engine", reused_engine),
+        ("auto (fast engine)", fast_engine),
+    ]:
+        seconds = min(timeit.repeat(function, number=1, repeat=3))
+        baseline = baseline or seconds
+        print(f"{name:28} {seconds * 1000:8.1f}ms ({baseline / seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
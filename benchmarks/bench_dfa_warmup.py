@@ -0,0 +1,66 @@
+"""Compare the first ANTLR parse in a fresh process with and without loading
+a DFA saved by save_antlr_dfa.
+
+Usage:
+    python benchmarks/bench_dfa_warmup.py [MIZ_PATH]
+"""
+
+import os.path
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+from dcsmissionpy import _parser
+
+_DEFAULT_MIZ = os.path.join(
+    os.path.dirname(__file__), os.pardir, "tests", "harpoon-radar.miz"
+)
+
+
+def _load(miz_path, member):
+    with zipfile.ZipFile(miz_path) as z:
+        return z.read(member).decode("utf-8")
+
+
+def _child(miz_path, dfa_path):
+    text = _load(miz_path, "mission")
+    if dfa_path:
+        start = time.perf_counter()
+        _parser.load_antlr_dfa(dfa_path)
+        print(f"load {(time.perf_counter() - start) * 1000:6.1f}ms ", end="")
+    times = []
+    for _ in range(2):
+        start = time.perf_counter()
+        _parser.lua_to_python(text, engine="antlr")
+        times.append(time.perf_counter() - start)
+    print(f"first parse {times[0] * 1000:6.1f}ms second {times[1] * 1000:6.1f}ms")
+
+
+def main():
+    if len(sys.argv) in (3, 4) and sys.argv[1] == "--child":
+        _child(sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else None)
+        return
+
+    miz_path = sys.argv[1] if len(sys.argv) > 1 else _DEFAULT_MIZ
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dfa_path = os.path.join(tmpdir, "dfa.pickle")
+        # Warm up on the files of the mission and save the result.
+        for member in ["mission", "warehouses", "options"]:
+            _parser.lua_to_python(_load(miz_path, member), engine="antlr")
+        _parser.save_antlr_dfa(dfa_path)
+        print(f"saved {os.path.getsize(dfa_path):,} bytes")
+
+        for name, args in [("cold", []), ("loaded DFA", [dfa_path])]:
+            result = subprocess.run(
+                [sys.executable, __file__, "--child", miz_path, *args],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            print(f"{name:12} {result.stdout.strip()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Compare the memory used by parsed missions for each intern mode.
+
+Usage:
+    python benchmarks/bench_intern.py [MIZ_PATH]
+"""
+
+import gc
+import os.path
+import sys
+import timeit
+import tracemalloc
+import zipfile
+
+from dcsmissionpy import _parser
+
+import synthetic
+
+_DEFAULT_MIZ = os.path.join(
+    os.path.dirname(__file__), os.pardir, "tests", "harpoon-radar.miz"
+)
+
+
+def _retained_size(text, intern):
+    gc.collect()
+    tracemalloc.start()
+    namespace = _parser.lua_to_python(text, intern=intern)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del namespace
+    return size
+
+
+def main():
+    miz_path = sys.argv[1] if len(sys.argv) > 1 else _DEFAULT_MIZ
+    with zipfile.ZipFile(miz_path) as z:
+        inputs = [(os.path.basename(miz_path), z.read("mission"))]
+    inputs.append(
+        ("synthetic (400 groups)", synthetic.synthetic_mission(groups=400).encode())
+    )
+
+    for name, text in inputs:
+        print(f"{name} ({len(text):,} bytes)")
+        baseline = None
+        for intern in ("none", "keys", "all"):
+            size = _retained_size(text, intern)
+            seconds = min(
+                timeit.repeat(
+                    lambda: _parser.lua_to_python(text, intern=intern),
+                    number=1,
+                    repeat=3,
+                )
+            )
+            baseline = baseline or size
+            print(
+                f"  intern={intern!r:8} {size / 2**20:8.2f}MiB "
+                f"({size / baseline:4.0%}) {seconds * 1000:8.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Compare the ANTLR lexer with the regex tokenizer used by the fast engine.
+
+Usage:
+    python benchmarks/bench_lexer.py [MIZ_PATH]
+"""
+
+import os.path
+import sys
+import timeit
+import zipfile
+
+import antlr4
+
+from dcsmissionpy import _parser
+from dcsmissionpy._lua_parser.LuaLexer import LuaLexer
+
+_DEFAULT_MIZ = os.path.join(
+    os.path.dirname(__file__), os.pardir, "tests", "harpoon-radar.miz"
+)
+
+
+def antlr_lex(text):
+    return LuaLexer(antlr4.InputStream(text)).getAllTokens()
+
+
+def regex_lex(text):
+    return list(_parser.tokenize(text))
+
+
+def main():
+    miz_path = sys.argv[1] if len(sys.argv) > 1 else _DEFAULT_MIZ
+    with zipfile.ZipFile(miz_path) as z:
+        for member in ["mission", "warehouses"]:
+            text = z.read(member).decode("utf-8")
+            antlr_time = min(timeit.repeat(lambda: antlr_lex(text), number=1))
+            regex_time = min(timeit.repeat(lambda: regex_lex(text), number=1))
+            print(
+                f"{member:12} {len(text):>10,} chars "
+                f"antlr {antlr_time * 1000:8.1f}ms "
+                f"regex {regex_time * 1000:8.1f}ms "
+                f"({antlr_time / regex_time:.0f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Time converting many files one after another and with lua_to_python_many.
+
+Usage:
+    python benchmarks/bench_many.py [MIZ_PATH...]
+"""
+
+import os
+import os.path
+import sys
+import time
+import zipfile
+
+from dcsmissionpy import _parser
+
+_DEFAULT_MIZ = os.path.join(
+    os.path.dirname(__file__), os.pardir, "tests", "harpoon-radar.miz"
+)
+
+_MEMBERS = ["mission", "warehouses", "l10n/DEFAULT/dictionary"]
+
+
+def _read_members(miz_paths):
+    sources = []
+    for miz_path in miz_paths:
+        with zipfile.ZipFile(miz_path) as z:
+            for member in _MEMBERS:
+                if member in z.namelist():
+                    sources.append(z.read(member))
+    return sources
+
+
+def main():
+    miz_paths = sys.argv[1:] or [_DEFAULT_MIZ]
+    sources = _read_members(miz_paths)
+    # Repeat small inputs so that the timings are meaningful.
+    sources = sources * max(1, 300 // len(sources))
+    print(f"{len(sources)} files, {os.cpu_count()} CPUs")
+
+    start = time.perf_counter()
+    for source in sources:
+        _parser.lua_to_python(source)
+    baseline = time.perf_counter() - start
+    print(f"{'serial':28} {baseline * 1000:8.1f}ms")
+
+    for workers, chunksize in [(None, 1), (None, 8), (None, 32)]:
+        start = time.perf_counter()
+        for result in _parser.lua_to_python_many(
+            sources, workers=workers, chunksize=chunksize
+        ):
+            if result.error is not None:
+                raise result.error
+        seconds = time.perf_counter() - start
+        name = f"workers={workers} chunksize={chunksize}"
+        print(f"{name:28} {seconds * 1000:8.1f}ms ({baseline / seconds:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Time parsing deeply nested tables with each engine.
+
+Usage:
+    python benchmarks/bench_nesting.py
+"""
+
+import timeit
+
+from dcsmissionpy import _parser
+
+
+def nested_tables(depth):
+    return "t = " + '{["a"] = 1, ' * depth + "2" + "}" * depth
+
+
+def main():
+    for depth in (10, 100, 500):
+        text = nested_tables(depth)
+        for engine in ("fast", "antlr"):
+            try:
+                seconds = min(
+                    timeit.repeat(
+                        lambda: _parser.lua_to_python(text, engine=engine),
+                        number=1,
+                        repeat=5,
+                    )
+                )
+            except _parser.NestingTooDeepError as e:
+                result = f"NestingTooDeepError({e})"
+            else:
+                result = f"{seconds * 1000:8.2f}ms"
+            print(f"depth {depth:4} {engine:6} {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Compare changing every unit's skill with patch_lua and by parsing and
+re-serializing the whole mission.
+
+Usage:
+    python benchmarks/bench_patch.py [GROUPS]
+"""
+
+import sys
+import timeit
+
+from dcsmissionpy import _parser, _serializer
+
+import synthetic
+
+_CHANGES = {
+    "mission.coalition.*.country.*.plane.group.*.units.*.skill": "Excellent",
+    "mission.weather.qnh": 750,
+}
+
+
+def _rewrite(text):
+    namespace = _parser.lua_to_python(text)
+    mission = namespace["mission"]
+    for coalition in mission["coalition"].values():
+        for country in coalition["country"].values():
+            for group in country["plane"]["group"].values():
+                for unit in group["units"].values():
+                    unit["skill"] = "Excellent"
+    mission["weather"]["qnh"] = 750
+    return _serializer.python_to_lua(namespace).encode()
+
+
+def main():
+    groups = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    text = synthetic.synthetic_mission(groups=groups).encode()
+    print(f"synthetic ({groups} groups, {len(text):,} bytes)")
+    baseline = None
+    for name, function in [
+        ("parse and serialize", lambda: _rewrite(text)),
+        ("patch_lua", lambda: _serializer.patch_lua(text, _CHANGES)),
+    ]:
+        seconds = min(timeit.repeat(function, number=1, repeat=3))
+        baseline = baseline or seconds
+        print(f"{name:20} {seconds * 1000:8.1f}ms ({baseline / seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
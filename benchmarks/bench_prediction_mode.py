@@ -0,0 +1,61 @@
+"""Compare the ANTLR prediction modes used by lua_to_python.
+
+Each mode is timed in a fresh process because the ANTLR DFA cache is shared by
+every parser in a process.
+
+Usage:
+    python benchmarks/bench_prediction_mode.py [MIZ_PATH]
+"""
+
+import os.path
+import subprocess
+import sys
+import time
+import zipfile
+
+from dcsmissionpy import _parser
+
+import synthetic
+
+_DEFAULT_MIZ = os.path.join(
+    os.path.dirname(__file__), os.pardir, "tests", "harpoon-radar.miz"
+)
+
+
+def _load(source):
+    if source.startswith("synthetic:"):
+        return synthetic.synthetic_mission(groups=int(source.split(":")[1]))
+    with zipfile.ZipFile(source) as z:
+        return z.read("mission").decode("utf-8")
+
+
+def _child(source, prediction_mode):
+    text = _load(source)
+    times = []
+    for _ in range(2):
+        start = time.perf_counter()
+        _parser.lua_to_python(text, engine="antlr", prediction_mode=prediction_mode)
+        times.append(time.perf_counter() - start)
+    print(f"{len(text):>10,} chars cold {times[0]:7.2f}s warm {times[1]:7.2f}s")
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        _child(sys.argv[2], sys.argv[3])
+        return
+
+    miz_path = sys.argv[1] if len(sys.argv) > 1 else _DEFAULT_MIZ
+    for source in [miz_path, "synthetic:40"]:
+        for mode in ["ll", "two_stage"]:
+            result = subprocess.run(
+                [sys.executable, __file__, "--child", source, mode],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            name = os.path.basename(source)
+            print(f"{name:20} {mode:10} {result.stdout.strip()}")
+
+
+if __name__ == "__main__":
+    main()
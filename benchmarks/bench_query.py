@@ -0,0 +1,57 @@
+"""Compare collecting every unit's type with nested loops over a full parse
+and with a Query.
+
+Usage:
+    python benchmarks/bench_query.py [GROUPS]
+"""
+
+import sys
+import timeit
+
+from dcsmissionpy import _parser
+
+import synthetic
+
+_QUERY = _parser.Query("mission.coalition.*.country[*].plane.group[*].units[*].type")
+
+
+def nested_loops(text):
+    types = []
+    mission = _parser.lua_to_python(text)["mission"]
+    for coalition in mission["coalition"].values():
+        for country in coalition["country"].values():
+            for group in country.get("plane", {}).get("group", {}).values():
+                for unit in group["units"].values():
+                    types.append(unit["type"])
+    return types
+
+
+def query(text):
+    return [value for _, value in _QUERY.find(text)]
+
+
+def query_lazy(text):
+    return [
+        value for _, value in _QUERY.find_in(_parser.lua_to_python(text, lazy=True))
+    ]
+
+
+def main():
+    groups = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    text = synthetic.synthetic_mission(groups=groups).encode()
+    print(f"synthetic ({groups} groups, {len(text):,} bytes)")
+    expected = nested_loops(text)
+    baseline = None
+    for name, function in [
+        ("nested loops", nested_loops),
+        ("Query.find", query),
+        ("Query.find_in (lazy)", query_lazy),
+    ]:
+        assert function(text) == expected
+        seconds = min(timeit.repeat(lambda: function(text), number=1, repeat=3))
+        baseline = baseline or seconds
+        print(f"{name:22} {seconds * 1000:8.1f}ms ({baseline / seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
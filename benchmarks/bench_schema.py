@@ -0,0 +1,72 @@
+"""Compare selecting unit fields as dicts with decoding them into slotted
+dataclasses with a Schema.
+
+Usage:
+    python benchmarks/bench_schema.py [GROUPS]
+"""
+
+import dataclasses
+import gc
+import sys
+import timeit
+import tracemalloc
+
+from dcsmissionpy import _parser
+
+import synthetic
+
+
+@dataclasses.dataclass(slots=True)
+class Unit:
+    type: str
+    skill: str
+    x: float
+    y: float
+    unit_id: int = dataclasses.field(metadata={"lua_key": "unitId"})
+
+
+@dataclasses.dataclass(slots=True)
+class Group:
+    name: str
+    group_id: int = dataclasses.field(metadata={"lua_key": "groupId"})
+    units: list[Unit] = dataclasses.field(default_factory=list)
+
+
+_GROUPS = "mission.coalition.*.country.*.plane.group"
+
+_SCHEMA = _parser.Schema({_GROUPS: list[Group]})
+
+_SELECT = [f"{_GROUPS}.*.{key}" for key in ["name", "groupId"]] + [
+    f"{_GROUPS}.*.units.*.{key}" for key in ["type", "skill", "x", "y", "unitId"]
+]
+
+
+def _retained_size(function):
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    groups = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    text = synthetic.synthetic_mission(groups=groups).encode()
+    units = groups * 4
+    print(f"synthetic ({groups} groups, {units} units, {len(text):,} bytes)")
+    for name, function in [
+        ("select (dicts)", lambda: _parser.lua_to_python(text, select=_SELECT)),
+        ("schema (slots)", lambda: _parser.lua_to_python(text, schema=_SCHEMA)),
+    ]:
+        size = _retained_size(function)
+        seconds = min(timeit.repeat(function, number=1, repeat=3))
+        print(
+            f"{name:16} {seconds * 1000:8.1f}ms {size / 2**20:6.2f}MiB "
+            f"({size / units:.0f} bytes per unit)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Compare parsing a whole mission with selecting the summary keys.
+
+Usage:
+    python benchmarks/bench_select.py [MIZ_PATH]
+"""
+
+import os.path
+import sys
+import timeit
+import zipfile
+
+from dcsmissionpy import _parser, mission
+
+import synthetic
+
+_DEFAULT_MIZ = os.path.join(
+    os.path.dirname(__file__), os.pardir, "tests", "harpoon-radar.miz"
+)
+
+
+def main():
+    miz_path = sys.argv[1] if len(sys.argv) > 1 else _DEFAULT_MIZ
+    with zipfile.ZipFile(miz_path) as z:
+        inputs = [(os.path.basename(miz_path), z.read("mission").decode("utf-8"))]
+    inputs.append(("synthetic (100 groups)", synthetic.synthetic_mission(groups=100)))
+
+    for name, text in inputs:
+        full = min(timeit.repeat(lambda: _parser.lua_to_python(text), number=1))
+        selected = min(
+            timeit.repeat(
+                lambda: _parser.lua_to_python(
+                    text, select=mission._MISSION_SUMMARY_PATHS
+                ),
+                number=1,
+            )
+        )
+        print(
+            f"{name:24} {len(text):>10,} chars full {full * 1000:8.1f}ms "
+            f"select {selected * 1000:8.1f}ms ({full / selected:.0f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Compare the time and peak memory of writing a large mission with
+python_to_lua and with the streaming write_lua.
+
+Usage:
+    python benchmarks/bench_serializer.py [GROUPS]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from dcsmissionpy import _parser, _serializer
+
+import synthetic
+
+
+def _measure(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    groups = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    namespace = _parser.lua_to_python(synthetic.synthetic_mission(groups=groups))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "mission")
+
+        def write_string():
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                f.write(_serializer.python_to_lua(namespace))
+
+        def write_stream():
+            with open(path, "wb") as f:
+                _serializer.write_lua(namespace, f)
+
+        for name, function in [
+            ("python_to_lua", write_string),
+            ("write_lua", write_stream),
+        ]:
+            seconds, peak = _measure(function)
+            print(f"{name:14} {seconds * 1000:8.1f}ms peak {peak / 2**20:8.2f}MiB")
+        print(f"{os.path.getsize(path):,} bytes")
+
+
+if __name__ == "__main__":
+    main()
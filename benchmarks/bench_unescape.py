@@ -0,0 +1,46 @@
+"""Time parse_normal_string on a 1 MB string literal.
+
+Usage:
+    python benchmarks/bench_unescape.py
+"""
+
+import timeit
+
+from dcsmissionpy import _parser
+
+_ESCAPES = {
+    "n": "\n",
+    "\\": "\\",
+    '"': '"',
+}
+
+
+def char_by_char_unescape(s):
+    """The previous implementation of parse_normal_string, for comparison."""
+    no_quotes = s[1:-1]
+    out = ""
+    was_escape = False
+    for c in no_quotes:
+        if was_escape:
+            was_escape = False
+            out += _ESCAPES.get(c, "\\" + c)
+        elif c == "\\":
+            was_escape = True
+        else:
+            out += c
+    return out
+
+
+def main():
+    line = r"if trigger.misc.getUserFlag(\"1\") then\n    a_out_text(\"Hello\")\n end\n"
+    escaped = '"' + line * (1024 * 1024 // len(line)) + '"'
+    plain = '"' + "x" * len(escaped) + '"'
+    print(f"{len(escaped):,} chars")
+    for name, text in [("escaped", escaped), ("no escapes", plain)]:
+        for f in [char_by_char_unescape, _parser.parse_normal_string]:
+            t = min(timeit.repeat(lambda: f(text), number=1, repeat=3))
+            print(f"{name:12} {f.__name__:24} {t * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Time parsing a large mission with its tables split across worker processes.
+
+Usage:
+    python benchmarks/bench_workers.py [GROUPS]
+"""
+
+import os
+import sys
+import time
+
+from dcsmissionpy import _parser
+
+import synthetic
+
+
+def main():
+    groups = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    text = synthetic.synthetic_mission(groups=groups).encode()
+    print(f"synthetic ({groups} groups, {len(text):,} bytes), {os.cpu_count()} CPUs")
+    baseline = None
+    for workers in sorted({None, 2, 4, os.cpu_count()}, key=lambda w: w or 0):
+        start = time.perf_counter()
+        _parser.lua_to_python(text, workers=workers)
+        seconds = time.perf_counter() - start
+        baseline = baseline or seconds
+        print(
+            f"workers={workers!s:5} {seconds * 1000:8.1f}ms ({baseline / seconds:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
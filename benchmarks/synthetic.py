@@ -0,0 +1,155 @@
+"""Generates large synthetic missions in the layout that DCS writes."""
+
+import random
+
+
+def _unit(rng, unit_id):
+    return {
+        "alt": rng.uniform(0, 10000),
+        "hardpoint_racks": True,
+        "alt_type": "BARO",
+        "livery_id": "default",
+        "skill": rng.choice(["Average", "Good", "High", "Excellent", "Client"]),
+        "speed": rng.uniform(100, 300),
+        "type": rng.choice(["F-16C_50", "FA-18C_hornet", "Su-25T", "MiG-29S"]),
+        "unitId": unit_id,
+        "psi": rng.uniform(-3.14, 3.14),
+        "y": rng.uniform(-1e6, 1e6),
+        "x": rng.uniform(-1e6, 1e6),
+        "name": f"Unit #{unit_id}",
+        "payload": {
+            "pylons": {
+                i: {"CLSID": "{6CEB49FC-DED8-4DED-B053-E1F033FF72D3}"}
+                for i in range(1, 5)
+            },
+            "fuel": 4900,
+            "flare": 60,
+            "chaff": 60,
+            "gun": 100,
+        },
+        "heading": rng.uniform(0, 6.28),
+        "callsign": {1: 1, 2: 1, "name": "Enfield11", 3: 1},
+        "onboard_num": "010",
+    }
+
+
+def _point(rng):
+    return {
+        "alt": rng.uniform(0, 10000),
+        "action": "Turning Point",
+        "alt_type": "BARO",
+        "speed": rng.uniform(100, 300),
+        "task": {
+            "id": "ComboTask",
+            "params": {"tasks": {}},
+        },
+        "type": "Turning Point",
+        "ETA": rng.uniform(0, 10000),
+        "ETA_locked": False,
+        "y": rng.uniform(-1e6, 1e6),
+        "x": rng.uniform(-1e6, 1e6),
+        "formation_template": "",
+        "speed_locked": True,
+    }
+
+
+def synthetic_mission_namespace(groups=1000, units=4, points=10, seed=0):
+    rng = random.Random(seed)
+    unit_id = 1
+    group_tables = {}
+    for group_id in range(1, groups + 1):
+        unit_tables = {}
+        for i in range(1, units + 1):
+            unit_tables[i] = _unit(rng, unit_id)
+            unit_id += 1
+        group_tables[group_id] = {
+            "modulation": 0,
+            "tasks": {},
+            "radioSet": False,
+            "task": "CAP",
+            "uncontrolled": False,
+            "route": {"points": {i: _point(rng) for i in range(1, points + 1)}},
+            "groupId": group_id,
+            "hidden": False,
+            "units": unit_tables,
+            "y": rng.uniform(-1e6, 1e6),
+            "x": rng.uniform(-1e6, 1e6),
+            "name": f"Group #{group_id}",
+            "communication": True,
+            "start_time": 0,
+            "frequency": 251,
+        }
+    return {
+        "mission": {
+            "requiredModules": {},
+            "date": {"Day": 21, "Year": 2016, "Month": 6},
+            "maxDictId": 6,
+            "sortie": "DictKey_sortie_5",
+            "theatre": "Caucasus",
+            "descriptionText": "DictKey_descriptionText_1",
+            "coalition": {
+                "blue": {
+                    "bullseye": {"y": 0, "x": 0},
+                    "nav_points": {},
+                    "name": "blue",
+                    "country": {
+                        1: {
+                            "id": 2,
+                            "name": "USA",
+                            "plane": {"group": group_tables},
+                        }
+                    },
+                },
+            },
+            "weather": {
+                "atmosphere_type": 0,
+                "wind": {"at8000": {"speed": 0, "dir": 0}},
+                "enable_fog": False,
+                "season": {"temperature": 20},
+                "qnh": 760,
+                "cyclones": {},
+                "name": "Winter, clean sky",
+            },
+            "currentKey": 1234,
+            "start_time": 28800,
+            "forcedOptions": {},
+        }
+    }
+
+
+def _format_key(key):
+    if isinstance(key, str):
+        return f'["{key}"]'
+    return f"[{key}]"
+
+
+def _format_scalar(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    elif isinstance(value, str):
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return repr(value)
+
+
+def _write_table(lines, table, indent):
+    lines.append(indent + "{")
+    inner = indent + "    "
+    for key, value in table.items():
+        k = _format_key(key)
+        if isinstance(value, dict):
+            lines.append(f"{inner}{k} = ")
+            _write_table(lines, value, inner)
+            lines[-1] += f", -- end of {k}"
+        else:
+            lines.append(f"{inner}{k} = {_format_scalar(value)},")
+    lines.append(indent + "}")
+
+
+def synthetic_mission(groups=1000, units=4, points=10, seed=0):
+    """Return the text of a "mission" file with `groups` aircraft groups."""
+    lines = []
+    for name, table in synthetic_mission_namespace(groups, units, points, seed).items():
+        lines.append(f"{name} = ")
+        _write_table(lines, table, "")
+        lines[-1] += f" -- end of {name}"
+    return "\n".join(lines) + "\n"
@@ -3,6 +3,7 @@ import os
 from typing import Iterator, Sequence, Tuple
 import winreg
 
+from dcsmissionpy.cache import NamespaceCache, ParseCache, namespace_cache
 from dcsmissionpy.mission import Mission
 
 
@@ -56,16 +57,31 @@ def get_installed_mission_paths(aircraft: str) -> Iterator[Tuple[str, str]]:
                     yield os.path.join(path, f), mission_type
 
 
-def get_installed_missions(aircraft: str) -> Iterator[Mission]:
+def get_installed_missions(
+    aircraft: str, parse_cache: ParseCache | None = None
+) -> Iterator[Mission]:
     for path, mission_type in get_installed_mission_paths(aircraft):
-        yield Mission(path, official_mission=True, official_mission_type=mission_type)
+        yield Mission(
+            path,
+            official_mission=True,
+            official_mission_type=mission_type,
+            parse_cache=parse_cache,
+        )
 
 
 def get_installed_mission(
-    aircraft: str, mission_type: str, mission_basepath: str
+    aircraft: str,
+    mission_type: str,
+    mission_basepath: str,
+    parse_cache: ParseCache | None = None,
 ) -> Mission:
     path = os.path.join(
         _get_dcs_path(),
         rf"Mods\aircraft\{aircraft}\Missions\{mission_type}\{mission_basepath}",
     )
-    return Mission(path, official_mission=True, official_mission_type=mission_type)
+    return Mission(
+        path,
+        official_mission=True,
+        official_mission_type=mission_type,
+        parse_cache=parse_cache,
+    )
@@ -0,0 +1,436 @@
+"""The ANTLR engine of lua_to_python.
+
+This module is imported on first use by _parser, as importing the ANTLR runtime
+and the generated lexer and parser is slow.
+"""
+
+import copy
+import hashlib
+import importlib.metadata
+import os
+import pickle
+import sys
+from typing import Any, Dict, Iterator, Tuple
+
+import antlr4
+
+from antlr4.PredictionContext import PredictionContext
+from antlr4.atn.ATNSimulator import ATNSimulator
+from antlr4.atn.LexerAction import (
+    LexerMoreAction,
+    LexerPopModeAction,
+    LexerSkipAction,
+)
+from antlr4.atn.PredictionMode import PredictionMode
+from antlr4.atn.SemanticContext import SemanticContext
+from antlr4.error.ErrorListener import ConsoleErrorListener
+from antlr4.error.ErrorStrategy import BailErrorStrategy, DefaultErrorStrategy
+from antlr4.error.Errors import ParseCancellationException
+from dcsmissionpy._lua_parser.LuaLexer import LuaLexer
+from dcsmissionpy._lua_parser.LuaParser import LuaParser
+from dcsmissionpy._parser import (
+    _INTERN_MAX_LENGTH,
+    NestingTooDeepError,
+    _negate,
+    parse_normal_string,
+)
+
+# Operations on the work stack of _TreeEvaluator.
+_EVALUATE, _NEGATE, _BINARY, _TABLE = range(4)
+
+_ExpContext = LuaParser.ExpContext
+_FieldContext = LuaParser.FieldContext
+_NumberContext = LuaParser.NumberContext
+_PrefixexpContext = LuaParser.PrefixexpContext
+_StatContext = LuaParser.StatContext
+_StringContext = LuaParser.StringContext
+_TableconstructorContext = LuaParser.TableconstructorContext
+_VarContext = LuaParser.VarContext
+_TERMINAL_VALUES = {"nil": None, "false": False, "true": True}
+
+
+class _TreeEvaluator:
+    """Evaluates the top-level assignments of a LuaParser parse tree.
+
+    Expressions are evaluated with an explicit work stack and value stack,
+    which are reused across expressions and calls to `evaluate`.
+    """
+
+    def __init__(self):
+        self._work = []
+        self._values = []
+        self._namespace = {}
+        self._interned = None
+        self._intern_values = False
+        # The number of tables that enclose the expression being evaluated.
+        self._depth = 0
+        self._max_depth = 1000
+
+    def evaluate(
+        self,
+        tree: LuaParser.ChunkContext,
+        namespace: Dict | None = None,
+        interned: Dict | None = None,
+        intern_values: bool = False,
+        max_depth: int = 1000,
+    ) -> Dict:
+        self._work.clear()
+        self._values.clear()
+        self._depth = 0
+        self._max_depth = max_depth
+        self._interned = interned
+        self._intern_values = intern_values
+        self._namespace = namespace = dict(namespace or {})
+        nodes = [tree]
+        while nodes:
+            node = nodes.pop()
+            if isinstance(node, antlr4.TerminalNode) or node.children is None:
+                # Nodes without children are left by error recovery.
+                continue
+            if type(node) is _StatContext:
+                children = node.children
+                # varlist '=' explist
+                if len(children) == 3 and type(children[0]) is LuaParser.VarlistContext:
+                    names = [
+                        var.getText()
+                        for var in children[0].children or ()
+                        if type(var) is _VarContext
+                    ]
+                    values = [
+                        self._evaluate(exp)
+                        for exp in children[2].children or ()
+                        if type(exp) is _ExpContext
+                    ]
+                    namespace.update(zip(names, values))
+            else:
+                nodes.extend(reversed(node.children))
+        self._namespace = self._interned = None
+        return namespace
+
+    def _evaluate(self, exp: LuaParser.ExpContext) -> Any:
+        work = self._work
+        values = self._values
+        work.append(exp)
+        work.append(_EVALUATE)
+        while work:
+            op = work.pop()
+            ctx = work.pop()
+            if op == _EVALUATE:
+                self._expand(ctx)
+            elif op == _NEGATE:
+                values[-1] = _negate(values[-1])
+            elif op == _BINARY:
+                right = values.pop()
+                if ctx == "+":
+                    values[-1] = values[-1] + right
+                elif ctx == "-":
+                    values[-1] = values[-1] - right
+                elif ctx == "*":
+                    values[-1] = values[-1] * right
+                else:
+                    values[-1] = values[-1] / right
+            else:
+                self._build_table(ctx)
+        return values.pop()
+
+    def _expand(self, ctx: LuaParser.ExpContext):
+        """Push the value of `ctx` or the work needed to compute it."""
+        work = self._work
+        # Nodes without children are left by error recovery.
+        children = ctx.children or ()
+        if len(children) == 1:
+            child = children[0]
+            child_type = type(child)
+            if child_type is _TableconstructorContext:
+                self._depth += 1
+                if self._depth > self._max_depth:
+                    raise NestingTooDeepError(
+                        f"line {ctx.start.line}: tables nested more than "
+                        f"{self._max_depth} deep"
+                    )
+                work.append(child)
+                work.append(_TABLE)
+                if len(child.children) == 3:
+                    # Push the fields in reverse so that they are evaluated in
+                    # source order, keys before values.
+                    for field in reversed(child.children[1].children):
+                        if type(field) is not _FieldContext:
+                            continue
+                        field_children = field.children
+                        if len(field_children) == 1:
+                            work.append(field_children[0])
+                            work.append(_EVALUATE)
+                        elif len(field_children) == 5:
+                            work.append(field_children[4])
+                            work.append(_EVALUATE)
+                            work.append(field_children[1])
+                            work.append(_EVALUATE)
+                        else:
+                            raise NotImplementedError(f"field({field.getText()})")
+            elif child_type is _StringContext:
+                token = child.children[0].symbol
+                if token.type != LuaParser.NORMALSTRING:
+                    raise NotImplementedError(f"string({token.text})")
+                value = parse_normal_string(token.text)
+                if self._intern_values and len(value) <= _INTERN_MAX_LENGTH:
+                    value = self._interned.setdefault(value, value)
+                self._values.append(value)
+            elif child_type is _NumberContext:
+                token = child.children[0].symbol
+                if token.type == LuaParser.FLOAT:
+                    self._values.append(float(token.text))
+                elif token.type == LuaParser.INT:
+                    self._values.append(int(token.text))
+                else:
+                    raise NotImplementedError(f"number({token.text})")
+            elif child_type is _PrefixexpContext:
+                if len(child.children) > 1:
+                    raise NotImplementedError(f"prefixexp({child.getText()})")
+                var_or_exp = child.children[0].children
+                if len(var_or_exp) == 1:
+                    self._values.append(self._namespace[var_or_exp[0].getText()])
+                else:
+                    # '(' exp ')'
+                    work.append(var_or_exp[1])
+                    work.append(_EVALUATE)
+            else:
+                text = child.getText()
+                if text not in _TERMINAL_VALUES:
+                    raise NotImplementedError(f"exp({text})")
+                self._values.append(_TERMINAL_VALUES[text])
+        elif len(children) == 2:
+            operator = children[0].getText()
+            if operator != "-":
+                raise NotImplementedError(f"Unsupported unary operator: {operator}")
+            work.append(None)
+            work.append(_NEGATE)
+            work.append(children[1])
+            work.append(_EVALUATE)
+        elif len(children) == 3 and type(children[1]) in (
+            LuaParser.OperatorAddSubContext,
+            LuaParser.OperatorMulDivModContext,
+        ):
+            operator = children[1].getText()
+            if operator not in ("+", "-", "*", "/"):
+                raise NotImplementedError(f"Unsupported binary operator: {operator}")
+            work.append(operator)
+            work.append(_BINARY)
+            work.append(children[2])
+            work.append(_EVALUATE)
+            work.append(children[0])
+            work.append(_EVALUATE)
+        else:
+            raise NotImplementedError(f"exp({ctx.getText()})")
+
+    def _build_table(self, ctx: LuaParser.TableconstructorContext):
+        values = self._values
+        fields = ctx.children[1].children if len(ctx.children) == 3 else ()
+        count = 0
+        for field in fields:
+            if type(field) is _FieldContext:
+                count += 1 if len(field.children) == 1 else 2
+        i = len(values) - count
+        base = i
+
+        table = {}
+        list_count = 1
+        interned = self._interned
+        for field in fields:
+            if type(field) is not _FieldContext:
+                continue
+            if len(field.children) == 1:
+                table[list_count] = values[i]
+                list_count += 1
+                i += 1
+            else:
+                key = values[i]
+                if interned is not None and type(key) is str:
+                    key = interned.setdefault(key, key)
+                # Positional fields take precedence over explicit keys.
+                if list_count == 1 or key not in range(1, list_count):
+                    table[key] = values[i + 1]
+                i += 2
+        del values[base:]
+        values.append(table)
+        self._depth -= 1
+
+
+class AntlrEngine:
+    """Holds an ANTLR lexer, parser and tree evaluator for reuse across calls."""
+
+    def __init__(self):
+        self._lexer = None
+        self._stream = None
+        self._parser = None
+        self._evaluator = _TreeEvaluator()
+
+    def _parse_chunk(self, text: str, prediction_mode: str) -> LuaParser.ChunkContext:
+        if self._parser is None:
+            self._lexer = LuaLexer(antlr4.InputStream(text))
+            self._stream = antlr4.CommonTokenStream(self._lexer)
+            self._parser = LuaParser(self._stream)
+        else:
+            self._lexer.inputStream = antlr4.InputStream(text)
+            self._stream.setTokenSource(self._lexer)
+            self._parser.setTokenStream(self._stream)
+        parser = self._parser
+        # Undo any changes made by a previous two-stage parse.
+        parser._errHandler = DefaultErrorStrategy()
+        parser.removeErrorListeners()
+        parser.addErrorListener(ConsoleErrorListener.INSTANCE)
+        if prediction_mode == "ll":
+            parser._interp.predictionMode = PredictionMode.LL
+            return parser.chunk()
+
+        parser._interp.predictionMode = PredictionMode.SLL
+        if prediction_mode == "sll":
+            return parser.chunk()
+
+        # SLL prediction is much faster than full LL prediction and only fails
+        # for input that is ambiguous or invalid, so try it first and bail out
+        # (without reporting errors) at the first syntax error.
+        parser._errHandler = BailErrorStrategy()
+        parser.removeErrorListeners()
+        try:
+            return parser.chunk()
+        except ParseCancellationException:
+            pass
+
+        parser.reset()
+        parser._errHandler = DefaultErrorStrategy()
+        parser.addErrorListener(ConsoleErrorListener.INSTANCE)
+        parser._interp.predictionMode = PredictionMode.LL
+        return parser.chunk()
+
+    def lua_to_python(
+        self,
+        text: str,
+        prediction_mode: str = "two_stage",
+        namespace: Dict | None = None,
+        interned: Dict | None = None,
+        intern_values: bool = False,
+        max_depth: int = 1000,
+    ) -> Any:
+        try:
+            tree = self._parse_chunk(text, prediction_mode)
+            return self._evaluator.evaluate(
+                tree, namespace, interned, intern_values, max_depth
+            )
+        finally:
+            if self._parser is not None:
+                # Drop the references to the input, its tokens and parse tree.
+                self._lexer.inputStream = None
+                self._stream.setTokenSource(self._lexer)
+                self._parser.setTokenStream(self._stream)
+
+
+# Bump when the format of the files written by save_antlr_dfa changes.
+_DFA_FORMAT_VERSION = 1
+
+_RECOGNIZERS = (("lexer", LuaLexer), ("parser", LuaParser))
+
+
+def _dfa_fingerprint() -> Tuple:
+    """Identify the grammar and runtime that a saved DFA is valid for."""
+    h = hashlib.sha256()
+    for name, recognizer in _RECOGNIZERS:
+        h.update(repr(sys.modules[recognizer.__module__].serializedATN()).encode())
+    return (
+        _DFA_FORMAT_VERSION,
+        importlib.metadata.version("antlr4-python3-runtime"),
+        h.hexdigest(),
+    )
+
+
+def _shared_dfa_objects() -> Iterator[Tuple[Any, Any]]:
+    """Yield (persistent id, object) for the objects referenced by DFA states
+    that belong to the grammar or the runtime, rather than to the DFA."""
+    yield "empty_context", PredictionContext.EMPTY
+    yield "no_semantic_context", SemanticContext.NONE
+    yield "error_state", ATNSimulator.ERROR
+    for action in (
+        LexerMoreAction.INSTANCE,
+        LexerPopModeAction.INSTANCE,
+        LexerSkipAction.INSTANCE,
+    ):
+        yield type(action).__name__, action
+    for name, recognizer in _RECOGNIZERS:
+        atn = recognizer.atn
+        yield (name, "atn"), atn
+        for state in atn.states:
+            yield (name, "state", state.stateNumber), state
+        for i, action in enumerate(atn.lexerActions or ()):
+            yield (name, "action", i), action
+
+
+class _DFAPickler(pickle.Pickler):
+    def __init__(self, file):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._ids = {id(obj): pid for pid, obj in _shared_dfa_objects()}
+
+    def persistent_id(self, obj):
+        return self._ids.get(id(obj))
+
+
+class _DFAUnpickler(pickle.Unpickler):
+    def __init__(self, file):
+        super().__init__(file)
+        self._objects = dict(_shared_dfa_objects())
+
+    def persistent_load(self, pid):
+        try:
+            return self._objects[pid]
+        except KeyError:
+            raise pickle.UnpicklingError(f"unknown persistent id: {pid!r}") from None
+
+
+def _dump_dfa(dfa) -> Tuple:
+    # The edges between states are replaced with indexes into `states` so that
+    # pickling does not recurse along paths through the DFA.
+    states = list(dfa._states)
+    state_count = len(states)
+    if dfa.s0 is not None and dfa.s0 not in dfa._states:
+        states.append(dfa.s0)  # The start state of a precedence DFA.
+    index = {id(state): i for i, state in enumerate(states)}
+    copies = []
+    edges = []
+    for state in states:
+        state_copy = copy.copy(state)
+        state_copy.edges = None
+        copies.append(state_copy)
+        if state.edges is None:
+            edges.append(None)
+        else:
+            edges.append(
+                [None if t is None else index.get(id(t), t) for t in state.edges]
+            )
+    s0 = None if dfa.s0 is None else index[id(dfa.s0)]
+    return copies, edges, state_count, s0
+
+
+def _load_dfa(dfa, saved: Tuple):
+    states, edges, state_count, s0 = saved
+    for state, state_edges in zip(states, edges):
+        if state_edges is not None:
+            state.edges = [states[t] if type(t) is int else t for t in state_edges]
+    dfa._states = {state: state for state in states[:state_count]}
+    dfa.s0 = None if s0 is None else states[s0]
+
+
+def save_dfa(path: str | os.PathLike):
+    dfas = {
+        name: [_dump_dfa(dfa) for dfa in recognizer.decisionsToDFA]
+        for name, recognizer in _RECOGNIZERS
+    }
+    with open(path, "wb") as f:
+        _DFAPickler(f).dump((_dfa_fingerprint(), dfas))
+
+
+def load_dfa(path: str | os.PathLike):
+    with open(path, "rb") as f:
+        fingerprint, dfas = _DFAUnpickler(f).load()
+    if fingerprint != _dfa_fingerprint():
+        raise ValueError(f"{path} was saved for a different grammar or runtime")
+    for name, recognizer in _RECOGNIZERS:
+        for dfa, saved in zip(recognizer.decisionsToDFA, dfas[name], strict=True):
+            _load_dfa(dfa, saved)
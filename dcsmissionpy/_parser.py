@@ -1,247 +1,1933 @@
-from typing import Any, Dict
+import codecs
+import collections
+import collections.abc
+import functools
+import itertools
+import os
+import re
+import threading
+import types
+import typing
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Tuple,
+)
 
-import antlr4
-
-from antlr4.tree.Trees import Trees
-from dcsmissionpy._lua_parser.LuaLexer import LuaLexer
-from dcsmissionpy._lua_parser.LuaVisitor import LuaVisitor
-from dcsmissionpy._lua_parser.LuaParser import LuaParser
-
-
-class VisitTable(LuaVisitor):
-    def __init__(self, namespace: Dict):
-        super().__init__()
-        self._namespace = namespace
-        self._table = {}
-        self._list_count = 1
-
-    def visitField(self, ctx: LuaParser.FieldContext):
-        match ctx.children:
-            case [LuaParser.ExpContext() as val]:
-                v = parse_expression(val, self._namespace)
-                self._table[self._list_count] = v
-                self._list_count += 1
-            case _, LuaParser.ExpContext() as key, _, _, LuaParser.ExpContext() as val:
-                k = parse_expression(key, self._namespace)
-                v = parse_expression(val, self._namespace)
-                if k not in range(1, self._list_count):
-                    self._table[k] = v
-            case _:
-                raise NotImplementedError(f"visitField({ctx.getText()})")
-
-
-def parse_table(ctx: LuaParser.TableconstructorContext, namespace: Dict) -> Any:
-    visitor = VisitTable(namespace)
-    visitor.visit(ctx)
-    return visitor._table
+if TYPE_CHECKING:
+    import concurrent.futures
 
+# Objects that support the buffer protocol, including mmap.mmap.
+_BytesLike = bytes | bytearray | memoryview
 
 _SINGLE_CHARACTER_ESCAPE_LUA_TO_PYTHON = {
     "a": "\a",
     "b": "\b",
+    "f": "\f",
     "n": "\n",
-    "\n": "\n",  # Line continuation
+    "r": "\r",
+    "t": "\t",
+    "v": "\v",
     "\\": "\\",
     '"': '"',
     "'": "'",
 }
 
+# The escape sequences described in "Lexical Conventions" in the Lua 5.4
+# Reference Manual.
+_ESCAPE_SEQUENCE = re.compile(
+    r"\\(?:"
+    r"(\r\n?|\n\r?)"  # Line continuation
+    r"|z[ \t\n\v\f\r]*"  # Skip the following whitespace
+    r"|x([0-9a-fA-F]{2})"
+    r"|([0-9]{1,3})"
+    r"|u\{([0-9a-fA-F]+)\}"
+    r"|(.))",
+    re.DOTALL,
+)
+_SIMPLE_ESCAPE_SEQUENCE = re.compile(r"(\\(?:\r\n?|\n\r?|.))", re.DOTALL)
+_ESCAPED_BYTE = re.compile("[\udc80-\udcff]")
+
 
-def parse_normal_string(s: str):
+def _byte_to_str(b: int) -> str:
+    # Bytes outside of ASCII may be part of a multi-byte UTF-8 sequence so they
+    # are represented using "surrogateescape" code points and decoded later.
+    if b < 0x80:
+        return chr(b)
+    elif b <= 0xFF:
+        return chr(0xDC00 + b)
+    else:
+        raise ValueError(f"decimal escape too large: {b}")
+
+
+# Escape sequences that map to a fixed string, keyed by the complete sequence.
+_FIXED_ESCAPES = {
+    "\\" + c: value for c, value in _SINGLE_CHARACTER_ESCAPE_LUA_TO_PYTHON.items()
+}
+_FIXED_ESCAPES.update({"\\\n": "\n", "\\\r": "\n", "\\\r\n": "\n", "\\\n\r": "\n"})
+
+
+def _unescape(m: re.Match) -> str:
+    escape = m.group()
+    value = _FIXED_ESCAPES.get(escape)
+    if value is not None:
+        return value
+
+    _, hex_byte, decimal_byte, code_point, c = m.groups()
+    if c is not None:
+        return escape
+    elif hex_byte is not None:
+        return _byte_to_str(int(hex_byte, 16))
+    elif decimal_byte is not None:
+        return _byte_to_str(int(decimal_byte))
+    elif code_point is not None:
+        code_point = int(code_point, 16)
+        if code_point > 0x10FFFF or 0xD800 <= code_point <= 0xDFFF:
+            # Lua can encode these but they cannot be represented in a str.
+            return "\ufffd"
+        return chr(code_point)
+    else:
+        return ""  # \z
+
+
+def parse_normal_string(s: str | _BytesLike):
+    if type(s) is not str:
+        s = str(s, "utf-8", "surrogateescape")
     no_quotes = s[1:-1]
-    out = ""
-    was_escape = False
-    for i, c in enumerate(no_quotes):
-        if was_escape:
-            was_escape = False
-            if c == "\r" and i + 1 < len(no_quotes) and no_quotes[i + 1] == "\n":
-                was_escape = True
+    if "\\" not in no_quotes:
+        return no_quotes
+    # Most strings only contain escapes from _FIXED_ESCAPES, which can be
+    # replaced without calling back into Python for each escape.
+    parts = _SIMPLE_ESCAPE_SEQUENCE.split(no_quotes)
+    escapes = list(map(_FIXED_ESCAPES.get, parts[1::2]))
+    if None not in escapes:
+        parts[1::2] = escapes
+        return "".join(parts)
+
+    out = _ESCAPE_SEQUENCE.sub(_unescape, no_quotes)
+    if _ESCAPED_BYTE.search(out):
+        # Bytes that are not valid UTF-8 remain as "surrogateescape" code points.
+        out = out.encode("utf-8", "surrogateescape").decode("utf-8", "surrogateescape")
+    return out
+
+
+def _negate(value: Any) -> Any:
+    """Negate a number. As Lua 5.1 numbers are doubles, -0 is negative zero."""
+    if value == 0 and type(value) is int:
+        return -0.0
+    return -value
+
+
+_PREDICTION_MODES = ("two_stage", "sll", "ll")
+
+_INTERN_MODES = ("none", "keys", "all")
+
+# The longest string value that is interned with intern="all". Longer strings
+# (descriptions, scripts) are rarely repeated.
+_INTERN_MAX_LENGTH = 64
+
+
+def _antlr_lua_to_python(
+    text: str,
+    prediction_mode: str = "two_stage",
+    namespace: Dict | None = None,
+    interned: Dict | None = None,
+    intern_values: bool = False,
+) -> Any:
+    return default_engine()._antlr_lua_to_python(
+        text, prediction_mode, namespace, interned, intern_values
+    )
+
+
+def save_antlr_dfa(path: str | os.PathLike):
+    """Save the prediction DFA that the ANTLR lexer and parser have built.
+
+    The ANTLR runtime builds its DFA while parsing, so the first parses in a
+    process are slow. Save it after parsing a representative corpus with
+    engine="antlr" and restore it in new processes with load_antlr_dfa. Must
+    not be called while another thread is parsing with ANTLR.
+    """
+    from dcsmissionpy import _antlr
+
+    _antlr.save_dfa(path)
+
+
+def load_antlr_dfa(path: str | os.PathLike):
+    """Replace the ANTLR prediction DFA with one saved by save_antlr_dfa.
+
+    Raises ValueError if the file was saved for a different grammar or ANTLR
+    runtime version. Only load files that you trust, as they are unpickled.
+    Must not be called while another thread is parsing with ANTLR.
+    """
+    from dcsmissionpy import _antlr
+
+    _antlr.load_dfa(path)
+
+
+class UnsupportedSyntaxError(Exception):
+    """Raised by the fast engine for Lua outside of the subset that DCS writes."""
+
+
+class NestingTooDeepError(Exception):
+    """Raised for tables nested more deeply than lua_to_python's max_depth."""
+
+
+# Token types produced by `tokenize`.
+(
+    EOF,
+    NAME,
+    INT,
+    FLOAT,
+    STRING,
+    TRUE,
+    FALSE,
+    NIL,
+    LBRACE,
+    RBRACE,
+    LBRACKET,
+    RBRACKET,
+    LPAREN,
+    RPAREN,
+    ASSIGN,
+    COMMA,
+    SEMICOLON,
+    PLUS,
+    MINUS,
+    STAR,
+    SLASH,
+    OTHER,
+) = range(22)
+
+TOKEN_NAMES = (
+    "EOF",
+    "NAME",
+    "INT",
+    "FLOAT",
+    "STRING",
+    "TRUE",
+    "FALSE",
+    "NIL",
+    "LBRACE",
+    "RBRACE",
+    "LBRACKET",
+    "RBRACKET",
+    "LPAREN",
+    "RPAREN",
+    "ASSIGN",
+    "COMMA",
+    "SEMICOLON",
+    "PLUS",
+    "MINUS",
+    "STAR",
+    "SLASH",
+    "OTHER",
+)
+
+_KEYWORDS = (
+    "and|break|do|else|elseif|end|for|function|goto|if|in|local|not|or|repeat"
+    "|return|then|until|while"
+)
+
+# The alternatives of the master token regex, in priority order. Every token
+# that the fast engine does not evaluate (keywords, long strings, single-quoted
+# strings, hexadecimal numbers and the remaining operators) is reported as
+# OTHER.
+_TOKEN_PATTERNS = [
+    (STRING, r'"[^"\\]*(?:\\.[^"\\]*)*"'),
+    (OTHER, r"\[=*\["),
+    (LBRACKET, r"\["),
+    (RBRACKET, r"\]"),
+    (OTHER, r"=="),
+    (ASSIGN, r"="),
+    (COMMA, r","),
+    (LBRACE, r"\{"),
+    (RBRACE, r"\}"),
+    (OTHER, r"0[xX][0-9a-fA-F]*(?:\.[0-9a-fA-F]*)?(?:[pP][+-]?\d+)?"),
+    (FLOAT, r"\d+\.\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?|\d+[eE][+-]?\d+"),
+    (INT, r"\d+"),
+    (TRUE, r"true\b"),
+    (FALSE, r"false\b"),
+    (NIL, r"nil\b"),
+    (OTHER, rf"(?:{_KEYWORDS})\b"),
+    (NAME, r"[A-Za-z_][A-Za-z0-9_]*"),
+    (SEMICOLON, r";"),
+    (LPAREN, r"\("),
+    (RPAREN, r"\)"),
+    (PLUS, r"\+"),
+    (MINUS, r"-"),
+    (STAR, r"\*"),
+    (OTHER, r"//"),
+    (SLASH, r"/"),
+    (EOF, r"\Z"),
+    (OTHER, r"."),
+]
+
+
+def _compile_token_regex(patterns):
+    # Each token is preceded by any amount of whitespace and comments so that
+    # they are skipped inside of the regex engine. The possessive quantifier
+    # prevents backtracking over long runs of whitespace.
+    skip = r"\s*+(?:--(?:\[(=*)\[.*?\]\1\]|[^\n]*)\s*+)*+"
+    alternatives = []
+    # Maps the index of each token group to its token type.
+    types = [None, None]
+    for token_type, pattern in patterns:
+        alternatives.append(f"({pattern})")
+        types.append(token_type)
+        types.extend([None] * re.compile(pattern).groups)
+    pattern = skip + "(?:" + "|".join(alternatives) + ")"
+    return (
+        re.compile(pattern, re.DOTALL),
+        re.compile(pattern.encode("ascii"), re.DOTALL),
+        tuple(types),
+    )
+
+
+# The same regex is used for str and for bytes-like objects (bytes, bytearray,
+# memoryview and mmap). Only the ASCII structure of the input is examined.
+# Compiled on first use, as compiling it takes longer than the rest of the
+# import of the package.
+@functools.cache
+def _token_regexes():
+    """Return the str and bytes token regexes and the group token types."""
+    return _compile_token_regex(_TOKEN_PATTERNS)
+
+
+def tokenize(text: str | _BytesLike, pos: int = 0) -> Iterator[Tuple[int, int, int]]:
+    """Yield (type, start, end) tuples for the tokens in `text`.
+
+    `text` may be a str or a bytes-like object. Whitespace and comments are
+    skipped. The last token is always EOF.
+    """
+    regex, bytes_regex, types = _token_regexes()
+    if not isinstance(text, str):
+        regex = bytes_regex
+    for m in regex.finditer(text, pos):
+        group = m.lastindex
+        token_type = types[group]
+        yield token_type, m.start(group), m.end()
+        if token_type == EOF:
+            return
+
+
+# Left binding power of the binary operators supported by the fast engine, see
+# "Precedence" in the Lua 5.4 Reference Manual.
+_BINARY_PRIORITY = {PLUS: 10, MINUS: 10, STAR: 11, SLASH: 11}
+_UNARY_PRIORITY = 12
+
+# Tokens that cannot follow a variable name in the supported subset e.g. the
+# start of the arguments of a function call.
+_NOT_AFTER_NAME = frozenset([LPAREN, LBRACE, LBRACKET, STRING, ASSIGN, OTHER])
+
+
+# Matches the rest of a table body up to and including the next brace, skipping
+# over strings and comments (which may contain braces).
+_SKIP_TO_BRACE_PATTERN = (
+    r"(?:[^{}\"'\-\[]+"
+    r'|"[^"\\]*(?:\\.[^"\\]*)*"'
+    r"|'[^'\\]*(?:\\.[^'\\]*)*'"
+    r"|--\[(=*)\[.*?\]\1\]"
+    r"|--[^\n]*"
+    r"|-"
+    r"|\[(=*)\[.*?\]\2\]"
+    r"|\[)*+"
+    r"(?:(\{)|\})"
+)
+
+
+@functools.cache
+def _skip_to_brace_regexes():
+    """Return the str and bytes regexes, compiled on first use."""
+    return (
+        re.compile(_SKIP_TO_BRACE_PATTERN, re.DOTALL),
+        re.compile(_SKIP_TO_BRACE_PATTERN.encode("ascii"), re.DOTALL),
+    )
+
+
+# A path component that matches every key.
+_ANY = "*"
+
+# The value of a top-level variable whose table was not selected.
+_SKIPPED = object()
+
+
+def _path_keys(path) -> Tuple:
+    """Convert "a.b.1" to ("a", "b", 1). Tuples are returned unchanged."""
+    if isinstance(path, str):
+        return tuple(int(key) if key.isdigit() else key for key in path.split("."))
+    return tuple(path)
+
+
+def _compile_selection(paths) -> Dict:
+    """Convert key paths into a trie of dicts.
+
+    A value of True means that the whole value at that path is selected.
+    """
+    trie = {}
+    for path in paths:
+        keys = _path_keys(path)
+        if not keys:
+            raise ValueError("empty path")
+        node = trie
+        for key in keys[:-1]:
+            child = node.get(key)
+            if child is True:
+                break
+            if child is None:
+                child = node[key] = {}
+            node = child
+        else:
+            node[keys[-1]] = True
+    return trie
+
+
+def _merge_selections(a, b):
+    if a is True or b is True:
+        return True
+    if type(a) is not dict or type(b) is not dict:
+        if a is b:
+            return a
+        raise ValueError("a schema path overlaps another path")
+    merged = dict(a)
+    for key, child in b.items():
+        merged[key] = _merge_selections(merged[key], child) if key in merged else child
+    return merged
+
+
+def _select_child(node: Dict, key):
+    """Return the selection for `key` in `node`, None if it is not selected."""
+    child = node.get(key)
+    wildcard = node.get(_ANY)
+    if wildcard is None:
+        return child
+    elif child is None:
+        return wildcard
+    return _merge_selections(child, wildcard)
+
+
+def _apply_selection(table: Dict, node: Dict, sequence_factory=None) -> Dict:
+    """Return the parts of `table` selected by `node`."""
+    selected = {}
+    for key, value in table.items():
+        child = _select_child(node, key)
+        if child is True:
+            if sequence_factory is not None:
+                value = _convert_sequences(value, sequence_factory)
+            selected[key] = value
+        elif type(child) is dict:
+            if type(value) is dict:
+                selected[key] = _apply_selection(value, child, sequence_factory)
+        elif child is not None:
+            selected[key] = child.convert(value, sequence_factory)
+    return selected
+
+
+class LuaSequence(collections.abc.Mapping):
+    """A read-only mapping from 1..n to the values of a Lua sequence.
+
+    Indexing is 1-based, as in Lua and in the dicts that lua_to_python returns
+    by default, but the values are stored in a tuple.
+    """
+
+    __slots__ = ("_items",)
+
+    def __init__(self, items: Iterable = ()):
+        self._items = tuple(items)
+
+    def __getitem__(self, key):
+        if type(key) is int and key >= 1:
+            try:
+                return self._items[key - 1]
+            except IndexError:
+                pass
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(range(1, len(self._items) + 1))
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return type(key) is int and 1 <= key <= len(self._items)
+
+    def values(self):
+        return self._items
+
+    def __reduce__(self):
+        return LuaSequence, (self._items,)
+
+    def __repr__(self):
+        return f"LuaSequence({list(self._items)!r})"
+
+
+_SEQUENCE_FACTORIES = {"dict": None, "list": list, "tuple": tuple, "lua": LuaSequence}
+
+
+def _to_sequence(table: Dict, factory):
+    """Return `table` converted by `factory` if its keys are 1..n in order."""
+    i = 0
+    for i, key in enumerate(table, 1):
+        if key != i or type(key) is not int:
+            return table
+    # Empty tables stay dicts, as they could be sequences or not.
+    if i == 0:
+        return table
+    return factory(table.values())
+
+
+def _convert_sequences(value: Any, factory) -> Any:
+    """Recursively apply _to_sequence to the tables in `value`."""
+    if type(value) is not dict:
+        return value
+    for key, child in value.items():
+        if type(child) is dict:
+            value[key] = _convert_sequences(child, factory)
+    return _to_sequence(value, factory)
+
+
+class _RecordNode:
+    """Decodes a table into an instance of a dataclass."""
+
+    __slots__ = ("cls", "fields")
+
+    def __init__(self, cls: type):
+        self.cls = cls
+        # Maps table keys to (field name, selection node).
+        self.fields = {}
+
+    def convert(self, value: Any, sequence_factory=None) -> Any:
+        """Decode a table that was parsed in full."""
+        if type(value) is not dict:
+            return value
+        values = {}
+        for key, (name, node) in self.fields.items():
+            if key in value:
+                values[name] = _convert_node(value[key], node, sequence_factory)
+        return self.cls(**values)
+
+
+class _CollectionNode:
+    """Decodes a table into a list, tuple or dict of its decoded values."""
+
+    __slots__ = ("factory", "item")
+
+    def __init__(self, factory: type, item):
+        self.factory = factory
+        self.item = item
+
+    def convert(self, value: Any, sequence_factory=None) -> Any:
+        """Decode a table that was parsed in full."""
+        if type(value) is not dict:
+            return value
+        items = {
+            key: _convert_node(child, self.item, sequence_factory)
+            for key, child in value.items()
+        }
+        return items if self.factory is dict else self.factory(items.values())
+
+
+def _convert_node(value: Any, node, sequence_factory) -> Any:
+    if node is True:
+        if sequence_factory is not None:
+            return _convert_sequences(value, sequence_factory)
+        return value
+    return node.convert(value, sequence_factory)
+
+
+_COLLECTION_TYPES = {
+    list: list,
+    tuple: tuple,
+    dict: dict,
+    collections.abc.Sequence: tuple,
+    collections.abc.Mapping: dict,
+}
+
+
+def _compile_type(annotation, records: Dict):
+    """Return the selection node that decodes values of type `annotation`."""
+    import dataclasses  # Slow to import and rarely needed.
+
+    if isinstance(annotation, type) and dataclasses.is_dataclass(annotation):
+        record = records.get(annotation)
+        if record is None:
+            # Added before its fields, so that types may refer to themselves.
+            record = records[annotation] = _RecordNode(annotation)
+            hints = typing.get_type_hints(annotation)
+            for field in dataclasses.fields(annotation):
+                if field.init:
+                    key = field.metadata.get("lua_key", field.name)
+                    node = _compile_type(hints[field.name], records)
+                    record.fields[key] = (field.name, node)
+        return record
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Union or origin is types.UnionType:
+        # e.g. Unit | None.
+        nodes = [_compile_type(arg, records) for arg in args if arg is not type(None)]
+        return nodes[0] if len(nodes) == 1 else True
+    factory = _COLLECTION_TYPES.get(origin)
+    if factory is not None and args:
+        # The value type of dict[K, V], list[V] and tuple[V, ...].
+        item = args[0] if args[-1] is Ellipsis else args[-1]
+        return _CollectionNode(factory, _compile_type(item, records))
+    return True
+
+
+class Schema:
+    """Decodes the tables at key paths into dataclasses while parsing.
+
+    `paths` maps key paths, as for lua_to_python's `select`, to types. A
+    dataclass decodes a table into an instance, reading each field from the
+    table key with the field's name or the field's metadata["lua_key"].
+    Fields whose types are dataclasses, or lists, tuples or dicts of them (or
+    of other types), are decoded in the same way. Values of other types are
+    converted as by lua_to_python and are not checked.
+
+    Pass the Schema to lua_to_python. The fast engine then builds the objects
+    while parsing and skips the tables and fields that the schema does not
+    mention. Use dataclasses with slots=True to make the objects small.
+    """
+
+    def __init__(self, paths: typing.Mapping[Any, Any]):
+        records = {}
+        self._selection = trie = {}
+        for path, annotation in paths.items():
+            keys = _path_keys(path)
+            if not keys:
+                raise ValueError("empty path")
+            node = trie
+            for key in keys[:-1]:
+                node = node.setdefault(key, {})
+                if type(node) is not dict:
+                    raise ValueError(f"{path!r} is inside another schema path")
+            if keys[-1] in node:
+                raise ValueError(f"{path!r} overlaps another schema path")
+            node[keys[-1]] = _compile_type(annotation, records)
+
+
+# A segment of a query: a name, "*" or digits after a "." (or at the start),
+# or "*", an integer or a string in brackets.
+_QUERY_SEGMENT = re.compile(
+    r"(\.)?(?:([A-Za-z_][A-Za-z0-9_]*|\*)|(\d+))"
+    r'|\[\s*(?:(\*)|(-?\d+)|("(?:[^"\\\n]|\\.)*"))\s*\]'
+)
+
+
+class Query:
+    """A compiled path query e.g. "mission.coalition.*.country[*].name".
+
+    A query is a top-level name followed by keys, each either ".name", ".1"
+    for an integer key, '["a key"]' for a string that is not a name, "[1]",
+    or ".*" or "[*]" to match every key. Integer keys are Lua's, so "[1]" is
+    the first value of a sequence.
+
+    Compile a query once and call find() for each source, which parses only
+    the tables on the path to the matches, or find_in() for values that have
+    already been parsed e.g. with lazy=True. To query many files, pass
+    select=[query.keys] to lua_to_python_many and call find_in() on each
+    result.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        keys = []
+        pos = 0
+        while pos < len(expression):
+            m = _QUERY_SEGMENT.match(expression, pos)
+            if m is None:
+                raise ValueError(f"invalid query at {pos}: {expression!r}")
+            dot, name, digits, any_key, number, string = m.groups()
+            if pos == 0 and (dot is not None or name is None):
+                raise ValueError(f"a query must start with a name: {expression!r}")
+            if pos > 0 and dot is None and (name is not None or digits is not None):
+                raise ValueError(f"expected '.' or '[' at {pos}: {expression!r}")
+            if name is not None:
+                keys.append(name)
+            elif digits is not None or number is not None:
+                keys.append(int(digits if number is None else number))
+            elif any_key is not None:
+                keys.append(_ANY)
             else:
-                out += _SINGLE_CHARACTER_ESCAPE_LUA_TO_PYTHON.get(c, "\\" + c)
-        elif c == "\\":
-            was_escape = True
+                key = parse_normal_string(string)
+                if key == _ANY:
+                    raise ValueError(f'the key "*" cannot be queried: {expression!r}')
+                keys.append(key)
+            pos = m.end()
+        if not keys:
+            raise ValueError("empty query")
+        # The query as a key path, as for lua_to_python's `select`.
+        self.keys = tuple(keys)
+
+    def __repr__(self):
+        return f"Query({self.expression!r})"
+
+    def find(
+        self,
+        text: str | _BytesLike,
+        engine: str = "auto",
+        intern: str = "keys",
+        sequences: str = "dict",
+        max_depth: int = 1000,
+    ) -> Iterator[Tuple[Tuple, Any]]:
+        """Yield (path, value) for each value in `text` that matches the query.
+
+        `path` is the tuple of keys of the value e.g. ("mission", "coalition",
+        "blue", "country", 1, "name"). Matches are yielded in the order of the
+        source. The fast engine skips the tables that cannot contain a match
+        without parsing them. The other arguments are as for lua_to_python.
+        """
+        namespace = lua_to_python(
+            text,
+            engine=engine,
+            select=[self.keys],
+            intern=intern,
+            sequences=sequences,
+            max_depth=max_depth,
+        )
+        return self.find_in(namespace)
+
+    def find_in(self, namespace: typing.Mapping) -> Iterator[Tuple[Tuple, Any]]:
+        """Yield (path, value) for each value in `namespace` that matches.
+
+        `namespace` is a result of lua_to_python. LazyLuaTables are only
+        loaded if they are on the path to a match. Lists and tuples are
+        treated as tables with the keys 1..n.
+        """
+        return _find(namespace, self.keys, 0, ())
+
+
+def _find(value: Any, keys: Tuple, i: int, path: Tuple) -> Iterator[Tuple[Tuple, Any]]:
+    if i == len(keys):
+        yield path, value
+        return
+    key = keys[i]
+    if isinstance(value, (list, tuple)):
+        if key == _ANY:
+            for index, item in enumerate(value, 1):
+                yield from _find(item, keys, i + 1, (*path, index))
+        elif type(key) is int and 1 <= key <= len(value):
+            yield from _find(value[key - 1], keys, i + 1, (*path, key))
+    elif isinstance(value, collections.abc.Mapping):
+        if key == _ANY:
+            for child_key, item in value.items():
+                yield from _find(item, keys, i + 1, (*path, child_key))
+        elif key in value:
+            yield from _find(value[key], keys, i + 1, (*path, key))
+
+
+class _FastParser:
+    """A recursive-descent evaluator for the Lua subset written by DCS.
+
+    Handles assignments of nil, booleans, numbers, double-quoted strings,
+    tables, variable references and the arithmetic operators + - * /. Anything
+    else raises UnsupportedSyntaxError.
+    """
+
+    def __init__(
+        self,
+        text: str | _BytesLike,
+        selection: Dict | None = None,
+        lazy: bool = False,
+        pos: int = 0,
+        namespace: Dict | None = None,
+        braces: Dict | None = None,
+        interned: Dict | None = None,
+        intern_values: bool = False,
+        sequence_factory=None,
+        max_depth: int = 1000,
+        spans: Dict | None = None,
+    ):
+        self._text = text
+        self._next_token = tokenize(text, pos).__next__
+        self._type, self._start, self._end = self._next_token()
+        self._namespace = {} if namespace is None else namespace
+        self._selection = selection
+        self._lazy = lazy
+        # In lazy mode, maps the offset of each "{" that has been scanned to the
+        # offset after its matching "}". Shared by every LazyLuaTable created
+        # from the same text so that each table is only scanned once.
+        self._braces = ({} if braces is None else braces) if lazy else None
+        # Variables whose tables were skipped or only partially parsed.
+        self._incomplete = set()
+        # Maps strings to their first occurrence, so that equal table keys (and
+        # string values if intern_values is true) share one object.
+        self._interned = interned
+        self._intern_values = intern_values
+        # Converts dense tables when set e.g. to `list`.
+        self._sequence_factory = sequence_factory
+        # The number of tables that enclose the current token.
+        self._depth = 0
+        self._max_depth = max_depth
+        # Maps the paths of the values selected in full to their spans.
+        self._spans = spans
+        if spans is not None:
+            # The keys of the tables that enclose the current token.
+            self._path = []
+            self._last_end = 0
+            self._advance = self._advance_recording_end
+
+    def _unsupported(self):
+        text = self._text
+        if not isinstance(text, str):
+            text = str(text, "utf-8", "replace")
+        line = text.count("\n", 0, self._start) + 1
+        snippet = text[self._start : self._start + 20]
+        return UnsupportedSyntaxError(f"line {line}: {snippet!r}")
+
+    def _advance(self):
+        self._type, self._start, self._end = self._next_token()
+
+    def _advance_recording_end(self):
+        self._last_end = self._end
+        self._type, self._start, self._end = self._next_token()
+
+    def _expect(self, token_type: int):
+        if self._type != token_type:
+            raise self._unsupported()
+        self._advance()
+
+    def _name(self) -> str:
+        if self._type != NAME:
+            raise self._unsupported()
+        name = self._text[self._start : self._end]
+        if type(name) is not str:
+            name = str(name, "ascii")
+        self._advance()
+        return name
+
+    def parse(self) -> Dict:
+        while self._type != EOF:
+            if self._type == SEMICOLON:
+                self._advance()
+                continue
+            names = [self._name()]
+            while self._type == COMMA:
+                self._advance()
+                names.append(self._name())
+            self._expect(ASSIGN)
+            if self._selection is None:
+                values = [self._exp()]
+                while self._type == COMMA:
+                    self._advance()
+                    values.append(self._exp())
+                self._namespace.update(zip(names, values))
+            else:
+                self._select_assignment(names)
+
+        if self._selection is None:
+            return self._namespace
+        namespace = {}
+        for name, value in self._namespace.items():
+            node = _select_child(self._selection, name)
+            if node is None or (type(node) is dict and type(value) is not dict):
+                continue
+            namespace[name] = value
+        return namespace
+
+    def _select_assignment(self, names):
+        values = []
+        nodes = []
+        while True:
+            node = name = None
+            if len(values) < len(names):
+                name = names[len(values)]
+                node = _select_child(self._selection, name)
+            values.append(self._select_exp(node, name))
+            nodes.append(node)
+            if self._type != COMMA:
+                break
+            self._advance()
+
+        for name, value, node in zip(names, values, nodes):
+            self._namespace[name] = value
+            if node is not True and (value is _SKIPPED or type(value) is dict):
+                self._incomplete.add(name)
+            else:
+                self._incomplete.discard(name)
+
+    def _select_exp(self, node, key) -> Any:
+        """Parse the parts of an expression selected by `node`.
+
+        Tables that are not selected are skipped without being tokenized and
+        _SKIPPED is returned in their place. `key` is the key of the value in
+        its table, or its name at the top level.
+        """
+        if node is True or self._type != LBRACE:
+            if node is not True or self._spans is None:
+                return self._exp()
+            start = self._start
+            value = self._exp()
+            self._spans[(*self._path, key)] = (start, self._last_end)
+            return value
+        if node is None:
+            self._skip_table()
+            value = _SKIPPED
+        elif type(node) is _RecordNode:
+            value = self._record_table(node)
+        elif type(node) is _CollectionNode:
+            value = self._collection_table(node)
+        elif self._spans is None:
+            value = self._select_table(node)
         else:
-            out += c
-    return out
+            self._path.append(key)
+            value = self._select_table(node)
+            self._path.pop()
+        if self._type in _BINARY_PRIORITY:
+            raise self._unsupported()
+        return value
 
+    def _skip_table(self) -> int:
+        """Skip the table at the current token and return its end offset."""
+        text = self._text
+        braces = self._braces
+        pos = None if braces is None else braces.pop(self._start, None)
+        if pos is None:
+            skip_to_brace = (
+                _skip_to_brace_regexes()[0 if isinstance(text, str) else 1]
+            ).match
+            pos = self._end
+            opened = [self._start]
+            while opened:
+                m = skip_to_brace(text, pos)
+                if m is None:
+                    raise self._unsupported()
+                pos = m.end()
+                if m.group(3) is not None:
+                    opened.append(pos - 1)
+                else:
+                    start = opened.pop()
+                    if braces is not None:
+                        braces[start] = pos
+        self._next_token = tokenize(text, pos).__next__
+        self._advance()
+        return pos
 
-def parse_string(ctx: LuaParser.StringContext):
-    if ctx.NORMALSTRING() is not None:
-        return parse_normal_string(ctx.getText())
-    else:
-        raise NotImplementedError(f"parse_string({ctx.getText()})")
+    def _lazy_table(self) -> "LazyLuaTable":
+        start = self._start
+        end = self._skip_table()
+        # Later assignments must not affect the values of variables referenced
+        # by the table.
+        namespace = self._namespace.copy() if self._namespace else _EMPTY_NAMESPACE
+        return LazyLuaTable(
+            self._text,
+            start,
+            end,
+            namespace,
+            self._braces,
+            self._interned,
+            self._intern_values,
+        )
+
+    def _select_table(self, node: Dict) -> Dict:
+        self._enter_table()
+        self._advance()
+        table = {}
+        list_count = 1
+        while True:
+            token_type = self._type
+            if token_type == RBRACE:
+                self._advance()
+                self._depth -= 1
+                return table
+            elif token_type == LBRACKET:
+                self._advance()
+                key = self._exp()
+                if self._interned is not None and type(key) is str:
+                    key = self._interned.setdefault(key, key)
+                self._expect(RBRACKET)
+                self._expect(ASSIGN)
+                # Positional fields take precedence over explicit keys.
+                if list_count == 1 or key not in range(1, list_count):
+                    child = _select_child(node, key)
+                else:
+                    child = None
+            else:
+                key = list_count
+                list_count += 1
+                child = _select_child(node, key)
 
+            value = self._select_exp(child, key)
+            if child is True or (
+                child is not None and (type(child) is not dict or type(value) is dict)
+            ):
+                table[key] = value
 
-def parse_number(ctx: LuaParser.NumberContext):
-    if ctx.FLOAT() is not None:
-        return float(ctx.getText())
-    elif ctx.INT() is not None:
-        return int(ctx.getText())
-    else:
-        raise NotImplementedError(f"parse_number({ctx.getText()})")
+            token_type = self._type
+            if token_type == COMMA or token_type == SEMICOLON:
+                self._advance()
+            elif token_type != RBRACE:
+                raise self._unsupported()
 
+    def _record_table(self, record: _RecordNode) -> Any:
+        self._enter_table()
+        self._advance()
+        fields = record.fields
+        values = {}
+        list_count = 1
+        while True:
+            token_type = self._type
+            if token_type == RBRACE:
+                self._advance()
+                self._depth -= 1
+                return record.cls(**values)
+            elif token_type == LBRACKET:
+                self._advance()
+                key = self._exp()
+                self._expect(RBRACKET)
+                self._expect(ASSIGN)
+            else:
+                key = list_count
+                list_count += 1
+
+            field = fields.get(key)
+            if field is not None:
+                values[field[0]] = self._select_exp(field[1], key)
+            elif self._type == LBRACE:
+                self._skip_table()
+            else:
+                self._exp()
 
-def parse_prefix_exp(ctx: LuaParser.PrefixexpContext, namespace: Dict):
-    value = None
+            token_type = self._type
+            if token_type == COMMA or token_type == SEMICOLON:
+                self._advance()
+            elif token_type != RBRACE:
+                raise self._unsupported()
 
-    class VisitPrefixExp(LuaVisitor):
-        def visitPrefixexp(self, ctx: LuaParser.PrefixexpContext):
-            if ctx.getChildCount() > 1:
-                raise NotImplementedError(f"parse_prefix_exp({ctx.getText()})")
+    def _collection_table(self, collection: _CollectionNode) -> Any:
+        self._enter_table()
+        self._advance()
+        item = collection.item
+        items = {}
+        list_count = 1
+        while True:
+            token_type = self._type
+            if token_type == RBRACE:
+                self._advance()
+                self._depth -= 1
+                if collection.factory is dict:
+                    return items
+                return collection.factory(items.values())
+            elif token_type == LBRACKET:
+                self._advance()
+                key = self._exp()
+                if self._interned is not None and type(key) is str:
+                    key = self._interned.setdefault(key, key)
+                self._expect(RBRACKET)
+                self._expect(ASSIGN)
+                # Positional fields take precedence over explicit keys.
+                keep = list_count == 1 or key not in range(1, list_count)
             else:
-                super().visitPrefixexp(ctx)
-
-        def visitVarOrExp(self, ctx: LuaParser.VarOrExpContext):
-            nonlocal value
-            match ctx.children:
-                case [LuaParser.VarContext() as v]:
-                    var = v.getText()
-                    value = namespace[var]
-                case [
-                    antlr4.TerminalNode(),
-                    LuaParser.ExpContext() as e,
-                    antlr4.TerminalNode(),
-                ]:
-                    value = parse_expression(e)
-
-    VisitPrefixExp().visit(ctx)
-    return value
-
-
-class ExpVisitor(LuaVisitor):
-    def __init__(self, namespace: Dict):
-        super().__init__()
-        self._namespace = namespace
-        self._value = None
-
-    def visitExp(self, ctx: LuaParser.ExpContext):
-        # print(Trees.toStringTree(ctx, None, parser))
-
-        match ctx.children:
-            case [antlr4.TerminalNode()]:
-                match ctx.getText():
-                    case "false":
-                        self._value = False
-                    case "true":
-                        self._value = True
-                    case "nil":
-                        self._value = None
-                    case _:
-                        raise NotImplementedError(f"visitExp({ctx.getText()})")
-            case [LuaParser.PrefixexpContext() as p]:
-                self._value = parse_prefix_exp(p, self._namespace)
-            case [LuaParser.NumberContext() as n]:
-                self._value = parse_number(n)
-            case [LuaParser.StringContext() as s]:
-                self._value = parse_string(s)
-            case [LuaParser.OperatorUnaryContext() as u, LuaParser.ExpContext() as e]:
-                value = parse_expression(e, self._namespace)
-                match u.getText():
-                    case "-":
-                        self._value = -value
-                    case _:
-                        raise NotImplementedError(
-                            f"Unsupported unary operator: {u.getText()})"
-                        )
-            case [
-                LuaParser.ExpContext() as a,
-                LuaParser.OperatorMulDivModContext() as u,
-                LuaParser.ExpContext() as b,
-            ]:
-                left = parse_expression(a, self._namespace)
-                right = parse_expression(b, self._namespace)
-                match u.getText():
-                    case "*":
-                        self._value = left * right
-                    case "/":
-                        self._value = left / right
-                    case _:
-                        raise NotImplementedError(
-                            f"Unsupported binary operator: {u.getText()})"
-                        )
-            case [
-                LuaParser.ExpContext() as a,
-                LuaParser.OperatorAddSubContext() as u,
-                LuaParser.ExpContext() as b,
-            ]:
-                left = parse_expression(a, self._namespace)
-                right = parse_expression(b, self._namespace)
-                match u.getText():
-                    case "-":
-                        self._value = left - right
-                    case "+":
-                        self._value = left + right
-                    case _:
-                        raise NotImplementedError(
-                            f"Unsupported binary operator: {u.getText()})"
-                        )
-            case [LuaParser.TableconstructorContext() as table]:
-                self._value = parse_table(table, self._namespace)
-            case _:
-                raise NotImplementedError(f"visitExp({ctx.getText()})")
-
-
-def parse_expression(ctx: LuaParser.ExpContext, namespace: Dict = {}):
-    visitor = ExpVisitor(namespace)
-    visitor.visit(ctx)
-    return visitor._value
-
-
-class ExpListVisitor(LuaVisitor):
-    def __init__(self, namespace: Dict):
-        super().__init__()
-        self._values = []
+                key = list_count
+                keep = True
+                list_count += 1
+
+            value = self._select_exp(item, key)
+            if keep:
+                items[key] = value
+
+            token_type = self._type
+            if token_type == COMMA or token_type == SEMICOLON:
+                self._advance()
+            elif token_type != RBRACE:
+                raise self._unsupported()
+
+    def _exp(self, limit: int = 0) -> Any:
+        if self._type == MINUS:
+            self._advance()
+            value = _negate(self._exp(_UNARY_PRIORITY))
+        else:
+            value = self._simple_exp()
+
+        while True:
+            op = self._type
+            priority = _BINARY_PRIORITY.get(op)
+            if priority is None or priority <= limit:
+                return value
+            self._advance()
+            right = self._exp(priority)
+            if op == PLUS:
+                value = value + right
+            elif op == MINUS:
+                value = value - right
+            elif op == STAR:
+                value = value * right
+            else:
+                value = value / right
+
+    def _simple_exp(self) -> Any:
+        token_type = self._type
+        if token_type == LBRACE:
+            if self._lazy:
+                return self._lazy_table()
+            return self._table()
+
+        text = self._text[self._start : self._end]
+        if token_type == STRING:
+            value = parse_normal_string(text)
+            if self._intern_values and len(value) <= _INTERN_MAX_LENGTH:
+                value = self._interned.setdefault(value, value)
+        elif token_type == INT:
+            value = int(text)
+        elif token_type == FLOAT:
+            value = float(text)
+        elif token_type == TRUE:
+            value = True
+        elif token_type == FALSE:
+            value = False
+        elif token_type == NIL:
+            value = None
+        elif token_type == LPAREN:
+            self._advance()
+            value = self._exp()
+            if self._type != RPAREN:
+                raise self._unsupported()
+        elif token_type == NAME:
+            if type(text) is not str:
+                text = str(text, "ascii")
+            self._advance()
+            if self._type in _NOT_AFTER_NAME or text in self._incomplete:
+                raise self._unsupported()
+            return self._namespace[text]
+        else:
+            raise self._unsupported()
+        self._advance()
+        return value
+
+    def _enter_table(self):
+        self._depth += 1
+        if self._depth > self._max_depth:
+            text = self._text
+            if not isinstance(text, str):
+                text = str(text, "utf-8", "replace")
+            line = text.count("\n", 0, self._start) + 1
+            raise NestingTooDeepError(
+                f"line {line}: tables nested more than {self._max_depth} deep"
+            )
+
+    def _table(self) -> Dict:
+        """Parse the table at the current token, including any sub-tables.
+
+        Sub-tables are parsed in the same loop, using an explicit stack of the
+        tables that contain them, so deep nesting does not recurse.
+        """
+        self._enter_table()
+        self._advance()
+        # (table, list_count, key, keep) for each table containing the current
+        # one, where `key` is the key of the current table in its parent and
+        # `keep` is false if a positional field overrides it.
+        parents = []
+        table = {}
+        list_count = 1
+        while True:
+            token_type = self._type
+            if token_type == RBRACE:
+                self._advance()
+                self._depth -= 1
+                if self._sequence_factory is not None:
+                    table = _to_sequence(table, self._sequence_factory)
+                if not parents:
+                    return table
+                if self._type in _BINARY_PRIORITY:
+                    raise self._unsupported()
+                value = table
+                table, list_count, key, keep = parents.pop()
+                if keep:
+                    table[key] = value
+            else:
+                if token_type == LBRACKET:
+                    self._advance()
+                    key = self._exp()
+                    if self._interned is not None and type(key) is str:
+                        key = self._interned.setdefault(key, key)
+                    self._expect(RBRACKET)
+                    self._expect(ASSIGN)
+                    # Positional fields take precedence over explicit keys.
+                    keep = list_count == 1 or key not in range(1, list_count)
+                else:
+                    key = list_count
+                    keep = True
+                    list_count += 1
+
+                if self._type == LBRACE and not self._lazy:
+                    self._enter_table()
+                    self._advance()
+                    parents.append((table, list_count, key, keep))
+                    table = {}
+                    list_count = 1
+                    continue
+                value = self._exp()
+                if keep:
+                    table[key] = value
+
+            token_type = self._type
+            if token_type == COMMA or token_type == SEMICOLON:
+                self._advance()
+            elif token_type != RBRACE:
+                raise self._unsupported()
+
+
+_EMPTY_NAMESPACE = {}
+
+
+class LazyLuaTable(collections.abc.Mapping):
+    """A read-only mapping for a Lua table that is parsed when first accessed.
+
+    Only the offsets of the table in the source text are recorded until the
+    table is first accessed. Its contents are then parsed and memoized, with
+    any sub-tables becoming LazyLuaTables themselves.
+    """
+
+    __slots__ = (
+        "_text",
+        "_start",
+        "_end",
+        "_namespace",
+        "_braces",
+        "_interned",
+        "_intern_values",
+        "_table",
+    )
+
+    def __init__(
+        self,
+        text: str | _BytesLike,
+        start: int,
+        end: int,
+        namespace: Dict,
+        braces: Dict,
+        interned: Dict | None = None,
+        intern_values: bool = False,
+    ):
+        self._text = text
+        self._start = start
+        self._end = end
         self._namespace = namespace
+        self._braces = braces
+        self._interned = interned
+        self._intern_values = intern_values
+        self._table = None
+
+    def _load(self) -> Dict:
+        if self._table is None:
+            text = self._text
+            try:
+                parser = _FastParser(
+                    text,
+                    lazy=True,
+                    pos=self._start,
+                    namespace=self._namespace,
+                    braces=self._braces,
+                    interned=self._interned,
+                    intern_values=self._intern_values,
+                )
+                self._table = parser._table()
+            except UnsupportedSyntaxError:
+                source = text[self._start : self._end]
+                if not isinstance(source, str):
+                    source = str(source, "utf-8", "surrogateescape")
+                source = "_ = " + source
+                self._table = _antlr_lua_to_python(
+                    source,
+                    namespace=self._namespace,
+                    interned=self._interned,
+                    intern_values=self._intern_values,
+                )["_"]
+            # The sub-tables keep references to the text that they need.
+            self._text = self._namespace = self._braces = self._interned = None
+        return self._table
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __contains__(self, key):
+        return key in self._load()
+
+    def get(self, key, default=None):
+        return self._load().get(key, default)
+
+    def keys(self):
+        return self._load().keys()
+
+    def items(self):
+        return self._load().items()
+
+    def values(self):
+        return self._load().values()
+
+    def __repr__(self):
+        if self._table is None:
+            return f"<LazyLuaTable [{self._start}:{self._end}]>"
+        return f"LazyLuaTable({self._table!r})"
+
+
+# When parsing in parallel, tables are split until each piece is at most
+# 1/(workers * _PIECES_PER_WORKER) of the text, so that the workers are kept
+# busy while the larger pieces are parsed.
+_PIECES_PER_WORKER = 4
+
+
+def _parse_pieces(sources: List[Tuple[Any, int]], options: Dict) -> List:
+    """Parse (table source, max_depth) pairs in a worker process."""
+    engine = default_engine()
+    values = []
+    for source, max_depth in sources:
+        source = ("_ = " if isinstance(source, str) else b"_ = ") + source
+        namespace = engine.lua_to_python(source, max_depth=max_depth, **options)
+        values.append(namespace["_"])
+    return values
+
+
+def _parse_in_parallel(
+    text: str | _BytesLike,
+    workers: "int | concurrent.futures.Executor",
+    engine: str,
+    prediction_mode: str,
+    intern: str,
+    sequences: str,
+    max_depth: int,
+) -> Dict | None:
+    """Parse `text` with its tables split into pieces that are parsed in
+    worker processes, or return None if it cannot be split."""
+    interned = None if intern == "none" else {}
+    intern_values = intern == "all"
+    sequence_factory = _SEQUENCE_FACTORIES[sequences]
+    parser = _FastParser(
+        text, lazy=True, interned=interned, intern_values=intern_values
+    )
+    try:
+        namespace = parser.parse()
+    except UnsupportedSyntaxError:
+        return None
+    # (table, key, LazyLuaTable, depth) for each table that is not yet split.
+    pending = []
+    for name, value in namespace.items():
+        if type(value) is LazyLuaTable:
+            if value._namespace:
+                # The table may refer to earlier variables, which the workers
+                # do not have.
+                return None
+            pending.append((namespace, name, value, 1))
+
+    # One fast scan over the braces finds the extent of every table, so the
+    # largest tables are split into their fields until the pieces are small.
+    worker_count = workers if isinstance(workers, int) else os.cpu_count() or 1
+    target = len(text) // (worker_count * _PIECES_PER_WORKER) + 1
+    expanded = []
+    pieces = []
+    while pending:
+        parent, key, lazy, depth = pending.pop()
+        if lazy._end - lazy._start <= target:
+            pieces.append((parent, key, lazy, depth))
+            continue
+        try:
+            table = _FastParser(
+                text,
+                lazy=True,
+                pos=lazy._start,
+                braces=parser._braces,
+                interned=interned,
+                intern_values=intern_values,
+            )._table()
+        except UnsupportedSyntaxError:
+            return None
+        parent[key] = table
+        expanded.append((parent, key, table))
+        for child_key, value in table.items():
+            if type(value) is LazyLuaTable:
+                pending.append((table, child_key, value, depth + 1))
 
-    def visitExp(self, ctx: LuaParser.ExpContext):
-        self._values.append(parse_expression(ctx, self._namespace))
+    # Pieces are sent in batches of about `target` bytes.
+    batches = []
+    batch = []
+    size = 0
+    for piece in pieces:
+        lazy = piece[2]
+        batch.append(piece)
+        size += lazy._end - lazy._start
+        if size >= target:
+            batches.append(batch)
+            batch = []
+            size = 0
+    if batch:
+        batches.append(batch)
 
+    options = {
+        "engine": engine,
+        "prediction_mode": prediction_mode,
+        "intern": intern,
+        "sequences": sequences,
+    }
+    sources = [
+        [
+            (text[lazy._start : lazy._end], max_depth - depth + 1)
+            for _, _, lazy, depth in batch
+        ]
+        for batch in batches
+    ]
+    options = [options] * len(batches)
+    if not batches:
+        results = []
+    elif isinstance(workers, int):
+        import concurrent.futures  # Slow to import and rarely needed.
+
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(_parse_pieces, sources, options))
+    else:
+        results = workers.map(_parse_pieces, sources, options)
+    for batch, values in zip(batches, results):
+        for (parent, key, _, _), value in zip(batch, values):
+            parent[key] = value
+
+    if sequence_factory is not None:
+        # Tables are expanded after the tables that contain them.
+        for parent, key, table in reversed(expanded):
+            parent[key] = _to_sequence(table, sequence_factory)
+    return namespace
+
+
+class LuaToPython:
+    """Converts Lua source into Python values, like lua_to_python.
+
+    The ANTLR lexer, parser and tree evaluator are created on first use and
+    reused by later calls, which avoids their setup cost when converting many
+    small files. Instances are not thread-safe; lua_to_python uses a
+    per-thread instance returned by default_engine().
+    """
 
-class VarListVisitor(LuaVisitor):
     def __init__(self):
-        super().__init__()
-        self._variables = []
-
-    def visitVarlist(self, ctx: LuaParser.VarlistContext):
-        return super().visitVarlist(ctx)
-
-    def visitVar(self, ctx: LuaParser.VarContext):
-        self._variables.append(ctx.getText())
-
-
-class TopLevelAssignmentVisitor(LuaVisitor):
-    def __init__(self) -> None:
-        super().__init__()
-        self._namespace = {}
-
-    def visit(self, tree):
-        return super().visit(tree)
-
-    def visitStat(self, ctx: LuaParser.StatContext):
-        match ctx.children:
-            case [
-                LuaParser.VarlistContext() as var_list,
-                _,
-                LuaParser.ExplistContext() as exp_list,
-            ]:
-                var_list_visitor = VarListVisitor()
-                var_list_visitor.visitVarlist(var_list)
-                exp_list_visitor = ExpListVisitor(self._namespace)
-                exp_list_visitor.visitExplist(exp_list)
-
-                self._namespace.update(
-                    zip(var_list_visitor._variables, exp_list_visitor._values)
+        self._antlr = None
+
+    def _antlr_lua_to_python(
+        self,
+        text: str,
+        prediction_mode: str = "two_stage",
+        namespace: Dict | None = None,
+        interned: Dict | None = None,
+        intern_values: bool = False,
+        max_depth: int = 1000,
+    ) -> Any:
+        if self._antlr is None:
+            # Imported here as loading the ANTLR runtime and the generated
+            # parser takes longer than the rest of the package.
+            from dcsmissionpy import _antlr
+
+            self._antlr = _antlr.AntlrEngine()
+        return self._antlr.lua_to_python(
+            text, prediction_mode, namespace, interned, intern_values, max_depth
+        )
+
+    def lua_to_python(
+        self,
+        text: str | _BytesLike,
+        engine: str = "auto",
+        prediction_mode: str = "two_stage",
+        select: Iterable | None = None,
+        lazy: bool = False,
+        intern: str = "keys",
+        sequences: str = "dict",
+        max_depth: int = 1000,
+        workers: "int | concurrent.futures.Executor | None" = None,
+        spans: Dict | None = None,
+        schema: "Schema | typing.Mapping | None" = None,
+    ) -> Any:
+        """See the module-level lua_to_python."""
+        if prediction_mode not in _PREDICTION_MODES:
+            raise ValueError(f"unknown prediction mode: {prediction_mode!r}")
+        if lazy and select is not None:
+            raise ValueError("select and lazy cannot be combined")
+        if intern not in _INTERN_MODES:
+            raise ValueError(f"unknown intern mode: {intern!r}")
+        if sequences not in _SEQUENCE_FACTORIES:
+            raise ValueError(f"unknown sequences mode: {sequences!r}")
+        sequence_factory = _SEQUENCE_FACTORIES[sequences]
+        if lazy and sequence_factory is not None:
+            raise ValueError("sequences and lazy cannot be combined")
+        if workers is not None and (lazy or select is not None):
+            raise ValueError("workers cannot be combined with select or lazy")
+        if isinstance(workers, int) and workers < 1:
+            raise ValueError(f"workers must be at least 1: {workers!r}")
+        if engine not in ("auto", "fast", "antlr"):
+            raise ValueError(f"unknown engine: {engine!r}")
+        if spans is not None and (select is None or engine == "antlr"):
+            raise ValueError("spans requires select and the fast engine")
+        if schema is not None:
+            if select is not None or lazy or workers is not None or spans is not None:
+                raise ValueError(
+                    "schema cannot be combined with select, lazy, workers or spans"
                 )
-            case _:
-                pass
+            if not isinstance(schema, Schema):
+                schema = Schema(schema)
+        if workers is not None and workers != 1:
+            namespace = _parse_in_parallel(
+                text, workers, engine, prediction_mode, intern, sequences, max_depth
+            )
+            if namespace is not None:
+                return namespace
+        if schema is not None:
+            selection = schema._selection
+        elif select is not None:
+            selection = _compile_selection(select)
+        else:
+            selection = None
+        interned = None if intern == "none" else {}
+        intern_values = intern == "all"
+        if engine in ("auto", "fast"):
+            try:
+                return _FastParser(
+                    text,
+                    selection,
+                    lazy,
+                    interned=interned,
+                    intern_values=intern_values,
+                    sequence_factory=sequence_factory,
+                    max_depth=max_depth,
+                    spans=spans,
+                ).parse()
+            except RecursionError:
+                raise NestingTooDeepError("expression nested too deeply") from None
+            except UnsupportedSyntaxError:
+                if engine == "fast" or spans is not None:
+                    raise
+        if not isinstance(text, str):
+            text = str(text, "utf-8", "surrogateescape")
+        try:
+            namespace = self._antlr_lua_to_python(
+                text,
+                prediction_mode,
+                interned=interned,
+                intern_values=intern_values,
+                max_depth=max_depth,
+            )
+        except RecursionError:
+            raise NestingTooDeepError(
+                "too deeply nested for the ANTLR engine"
+            ) from None
+        if selection is not None:
+            namespace = _apply_selection(namespace, selection, sequence_factory)
+        elif sequence_factory is not None:
+            for name, value in namespace.items():
+                namespace[name] = _convert_sequences(value, sequence_factory)
+        return namespace
+
+
+_local = threading.local()
+
+
+def default_engine() -> LuaToPython:
+    """Return the LuaToPython instance used by lua_to_python in this thread."""
+    try:
+        return _local.engine
+    except AttributeError:
+        _local.engine = engine = LuaToPython()
+        return engine
+
+
+def lua_to_python(
+    text: str | _BytesLike,
+    engine: str = "auto",
+    prediction_mode: str = "two_stage",
+    select: Iterable | None = None,
+    lazy: bool = False,
+    intern: str = "keys",
+    sequences: str = "dict",
+    max_depth: int = 1000,
+    workers: "int | concurrent.futures.Executor | None" = None,
+    spans: Dict | None = None,
+    schema: "Schema | typing.Mapping | None" = None,
+) -> Any:
+    """Evaluate the top-level assignments in `text` and return them as a dict.
+
+    `text` may be a str or a bytes-like object containing UTF-8. Parsing bytes
+    avoids decoding anything but the contents of strings.
+
+    `engine` is one of:
+        "auto": use the fast engine, falling back to ANTLR for syntax that it
+            does not handle.
+        "fast": use the fast engine only, raising UnsupportedSyntaxError for
+            syntax that it does not handle.
+        "antlr": use the ANTLR-generated parser.
+
+    `prediction_mode` controls how the ANTLR parser predicts alternatives:
+        "two_stage": try SLL prediction and re-parse with full LL prediction
+            if that fails.
+        "sll": SLL prediction only. Fast but may reject some valid input.
+        "ll": full LL prediction only.
+
+    `select` is an optional collection of key paths e.g.
+    ["mission.sortie", ("mission", "pictureFileNameB")]. Path components that
+    consist of digits are integer keys and "*" matches any key. If given, only
+    the values at those paths (and the tables that contain them) are returned
+    and the fast engine skips the tables that are not selected without
+    parsing them.
+
+    If `lazy` is true then the fast engine returns tables as LazyLuaTables,
+    which are only parsed when first accessed. LazyLuaTables keep a reference
+    to `text`. If the ANTLR engine is used then all of the tables are parsed
+    up front.
+
+    `intern` controls which strings are deduplicated while parsing, so that
+    equal strings share one object:
+        "keys": string table keys e.g. "x", "type" and "unitId".
+        "all": string table keys and string values of up to 64 characters
+            e.g. unit types and skills.
+        "none": no deduplication.
+
+    `sequences` controls how tables with the keys 1..n (in that order) are
+    returned:
+        "dict": as dicts.
+        "list": as lists, indexed from 0.
+        "tuple": as tuples, indexed from 0.
+        "lua": as LuaSequences, read-only mappings indexed from 1.
+    Empty tables, and tables that are only partially selected by `select`,
+    are always dicts. `sequences` cannot be combined with `lazy`.
+
+    NestingTooDeepError is raised if tables are nested more than `max_depth`
+    deep, or if the input is too deeply nested for the ANTLR engine.
+
+    If `workers` is a number greater than 1, or a concurrent.futures.Executor,
+    the extent of each table is found in one fast scan and the largest tables
+    are split into pieces that are parsed in that many worker processes (or
+    by the executor) and then reassembled. This is only worthwhile for large
+    files such as the `mission` of a big multiplayer mission. Strings are
+    only interned within each piece. Text with tables that follow other
+    assignments, or that the fast engine cannot scan, is parsed without
+    workers. `workers` cannot be combined with `select` or `lazy`.
+
+    If `spans` is a dict then it is filled with the (start, end) offsets in
+    `text` of each value that `select` selects in full, keyed by its path as
+    a tuple e.g. ("mission", "weather", "qnh"). The offsets are of characters
+    if `text` is a str and of bytes otherwise. Requires `select` and the fast
+    engine; with engine="auto", UnsupportedSyntaxError is raised rather than
+    falling back to ANTLR.
+
+    `schema` is a Schema, or a mapping of key paths to dataclasses to compile
+    into one, that decodes the tables at those paths into dataclass instances.
+    Like `select`, only the values at those paths (and the tables that
+    contain them) are returned, and the fast engine builds the instances
+    directly while parsing, skipping the fields that they do not have. If the
+    ANTLR engine is used then the instances are built from the parsed tables.
+    `schema` cannot be combined with `select`, `lazy`, `workers` or `spans`.
+    """
+    return default_engine().lua_to_python(
+        text,
+        engine,
+        prediction_mode,
+        select,
+        lazy,
+        intern,
+        sequences,
+        max_depth,
+        workers,
+        spans,
+        schema,
+    )
+
+
+class ParseResult(NamedTuple):
+    """The result of converting one source with lua_to_python_many."""
+
+    # The position of the source in the input.
+    index: int
+    # The result of lua_to_python, or None if it raised an exception.
+    namespace: Dict | None
+    # The exception raised by lua_to_python, if any.
+    error: Exception | None
+
 
+def _parse_batch(batch: List[Tuple[int, Any]], options: Dict) -> List[ParseResult]:
+    """Convert (index, source) pairs, in a worker process if there are workers."""
+    engine = default_engine()
+    results = []
+    for index, source in batch:
+        try:
+            namespace = engine.lua_to_python(source, **options)
+        except Exception as e:
+            results.append(ParseResult(index, None, e))
+        else:
+            results.append(ParseResult(index, namespace, None))
+    return results
+
+
+def lua_to_python_many(
+    sources: Iterable[str | _BytesLike],
+    workers: "int | concurrent.futures.Executor | None" = None,
+    chunksize: int = 1,
+    ordered: bool = True,
+    **options,
+) -> Iterator[ParseResult]:
+    """Convert many sources with lua_to_python in worker processes.
+
+    Yields a ParseResult for each source, in the order of `sources` if
+    `ordered` is true or else as they are completed. An exception raised for
+    one source is returned in its ParseResult rather than raised, so the
+    other sources are still converted.
+
+    `workers` is the number of worker processes (by default the number of
+    CPUs), 1 to convert the sources in this process, or a
+    concurrent.futures.Executor to submit to. Sources are sent to the workers
+    `chunksize` at a time. Passing the bytes of each file, rather than
+    decoding them first, keeps the cost of sending them to the workers low.
+
+    `options` are passed to lua_to_python, except that `lazy` cannot be true.
+    Invalid arguments raise ValueError when lua_to_python_many is called.
+    """
+    if options.get("lazy"):
+        raise ValueError("lazy cannot be passed to lua_to_python_many")
+    if chunksize < 1:
+        raise ValueError(f"chunksize must be at least 1: {chunksize!r}")
+    if isinstance(workers, int) and workers < 1:
+        raise ValueError(f"workers must be at least 1: {workers!r}")
+    # Check the options before starting any workers.
+    default_engine().lua_to_python("", **options)
+    return _iter_many(sources, workers, chunksize, ordered, options)
+
+
+def _iter_many(
+    sources: Iterable[str | _BytesLike],
+    workers: "int | concurrent.futures.Executor | None",
+    chunksize: int,
+    ordered: bool,
+    options: Dict,
+) -> Iterator[ParseResult]:
+    sources = enumerate(sources)
+    if workers == 1:
+        while batch := list(itertools.islice(sources, chunksize)):
+            yield from _parse_batch(batch, options)
+        return
+
+    import concurrent.futures  # Slow to import and rarely needed.
+
+    if workers is None or isinstance(workers, int):
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+        worker_count = workers or os.cpu_count() or 1
+    else:
+        executor = workers
+        worker_count = os.cpu_count() or 1
+    # Limit the number of batches in flight, so that a long iterable of
+    # sources is not read into memory all at once.
+    max_pending = 2 * worker_count
+    pending = collections.deque() if ordered else set()
+    try:
+        while True:
+            batch = [
+                # Memory maps and memoryviews cannot be pickled.
+                (i, s if isinstance(s, (str, bytes)) else bytes(s))
+                for i, s in itertools.islice(sources, chunksize)
+            ]
+            if batch:
+                future = executor.submit(_parse_batch, batch, options)
+                if ordered:
+                    pending.append(future)
+                else:
+                    pending.add(future)
+            elif not pending:
+                break
+            if not batch or len(pending) >= max_pending:
+                if ordered:
+                    yield from pending.popleft().result()
+                else:
+                    done, pending = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for future in done:
+                        yield from future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if executor is not workers:
+            executor.shutdown(cancel_futures=True)
+
+
+# Events yielded by iterparse_lua.
+START_TABLE = "start_table"
+SCALAR = "scalar"
+END_TABLE = "end_table"
+
+_LONG_COMMENT = re.compile(r"--\[(=*)\[.*?\]\1\]", re.DOTALL)
+_LONG_BRACKET = re.compile(r"\[=*\[")
+
+
+def _has_unterminated_long_comment(text: str, start: int, end: int) -> bool:
+    """Return whether the whitespace and comments in text[start:end] contain
+    a long comment without its closing bracket, which the token regex reads
+    as a line comment."""
+    i = text.find("--", start, end)
+    while i != -1:
+        if _LONG_BRACKET.match(text, i + 2):
+            m = _LONG_COMMENT.match(text, i)
+            if m is None:
+                return True
+            i = m.end()
+        else:
+            # A line comment, which may contain "--[[" e.g. "-- see --[[".
+            i = text.find("\n", i, end)
+            if i == -1:
+                return False
+        i = text.find("--", i, end)
+    return False
+
+
+def _iter_stream_tokens(fileobj: IO, chunk_size: int) -> Iterator[Tuple[int, str]]:
+    """Yield (type, text) tuples for the tokens read from `fileobj`.
+
+    Only the data needed to complete the current token is buffered.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    regex, _, types = _token_regexes()
+    match = regex.match
+    buffer = ""
+    pos = 0
+    final = False
+    while True:
+        m = match(buffer, pos)
+        group = m.lastindex
+        token_type = types[group]
+        end = m.end()
+        # A token that reaches the end of the buffer may continue in the next
+        # chunk and OTHER may be the start of an incomplete string.
+        if not final and (
+            end == len(buffer)
+            or token_type == OTHER
+            or _has_unterminated_long_comment(buffer, pos, m.start(group))
+        ):
+            chunk = fileobj.read(chunk_size)
+            final = not chunk
+            if isinstance(chunk, bytes):
+                chunk = decoder.decode(chunk, final)
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield token_type, buffer[m.start(group) : end]
+        if token_type == EOF:
+            return
+        pos = end
+
+
+def _stream_scalar(token_type, text, next_token):
+    """Return (value, next token type, next token text) for a literal."""
+    negations = 0
+    while token_type == MINUS:
+        negations += 1
+        token_type, text = next_token()
+
+    if token_type == STRING:
+        value = parse_normal_string(text)
+    elif token_type == INT:
+        value = int(text)
+    elif token_type == FLOAT:
+        value = float(text)
+    elif token_type == TRUE:
+        value = True
+    elif token_type == FALSE:
+        value = False
+    elif token_type == NIL:
+        value = None
+    else:
+        raise UnsupportedSyntaxError(f"{text!r} is not a literal")
+    for _ in range(negations):
+        value = _negate(value)
 
-def lua_to_python(text: str) -> Any:
-    lexer = LuaLexer(antlr4.InputStream(text))
+    token_type, text = next_token()
+    if token_type in _BINARY_PRIORITY:
+        raise UnsupportedSyntaxError(f"{text!r} in a streamed expression")
+    return value, token_type, text
 
-    stream = antlr4.CommonTokenStream(lexer)
-    parser = LuaParser(stream)
-    tree = parser.chunk()
-    visitor = TopLevelAssignmentVisitor()
-    visitor.visit(tree)
-    return visitor._namespace
+
+def iterparse_lua(fileobj: IO, chunk_size: int = 64 * 1024) -> Iterator[Tuple]:
+    """Incrementally parse the top-level assignments read from `fileobj`.
+
+    `fileobj` may be opened in binary mode (in which case it is decoded as
+    UTF-8) or text mode. It is read `chunk_size` at a time and the following
+    events are yielded, in source order, as the input is parsed:
+        (START_TABLE, path): the start of a table.
+        (SCALAR, path, value): a scalar value.
+        (END_TABLE, path): the end of a table.
+
+    `path` is a tuple of keys starting with the variable name e.g.
+    ("mission", "date", "Year").
+
+    Only assignments of literals and tables are supported, UnsupportedSyntaxError
+    is raised for anything else. Keys that are assigned more than once produce
+    events for each assignment.
+    """
+    next_token = _iter_stream_tokens(fileobj, chunk_size).__next__
+    token_type, text = next_token()
+    # [path, list_count, suppressed] for each open table.
+    tables = []
+    while True:
+        if tables:
+            table = tables[-1]
+            path, list_count, suppressed = table
+            if token_type == RBRACE:
+                tables.pop()
+                if not suppressed:
+                    yield END_TABLE, path
+                token_type, text = next_token()
+                if not tables:
+                    continue
+            else:
+                if token_type == LBRACKET:
+                    token_type, text = next_token()
+                    key, token_type, text = _stream_scalar(token_type, text, next_token)
+                    if token_type != RBRACKET:
+                        raise UnsupportedSyntaxError(f"expected ']', got {text!r}")
+                    token_type, text = next_token()
+                    if token_type != ASSIGN:
+                        raise UnsupportedSyntaxError(f"expected '=', got {text!r}")
+                    token_type, text = next_token()
+                    # Positional fields take precedence over explicit keys.
+                    field_suppressed = suppressed or (
+                        list_count > 1 and key in range(1, list_count)
+                    )
+                else:
+                    key = list_count
+                    table[1] += 1
+                    field_suppressed = suppressed
+                field_path = path + (key,)
+                if token_type == LBRACE:
+                    if not field_suppressed:
+                        yield START_TABLE, field_path
+                    tables.append([field_path, 1, field_suppressed])
+                    token_type, text = next_token()
+                    continue
+                value, token_type, text = _stream_scalar(token_type, text, next_token)
+                if not field_suppressed:
+                    yield SCALAR, field_path, value
+
+            # The separator after a field.
+            if token_type == COMMA or token_type == SEMICOLON:
+                token_type, text = next_token()
+            elif token_type != RBRACE:
+                raise UnsupportedSyntaxError(f"expected '}}', got {text!r}")
+        elif token_type == EOF:
+            return
+        elif token_type == SEMICOLON:
+            token_type, text = next_token()
+        elif token_type == NAME:
+            path = (text,)
+            token_type, text = next_token()
+            if token_type != ASSIGN:
+                raise UnsupportedSyntaxError(f"expected '=', got {text!r}")
+            token_type, text = next_token()
+            if token_type == LBRACE:
+                yield START_TABLE, path
+                tables.append([path, 1, False])
+                token_type, text = next_token()
+            else:
+                value, token_type, text = _stream_scalar(token_type, text, next_token)
+                yield SCALAR, path, value
+        else:
+            raise UnsupportedSyntaxError(f"unexpected {text!r}")
@@ -0,0 +1,268 @@
+import collections.abc
+import io
+import math
+import re
+from typing import IO, Any, Dict, Iterator, List, Mapping, Tuple
+
+from dcsmissionpy._parser import _ANY, _BytesLike, _path_keys, lua_to_python
+
+# The escapes written by Lua 5.1's string.format("%q"), which DCS uses.
+_STRING_ESCAPES = str.maketrans(
+    {"\\": "\\\\", '"': '\\"', "\n": "\\\n", "\r": "\\r", "\0": "\\000"}
+)
+
+_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*\Z")
+
+_INDENT = "    "
+
+_MISSING = object()
+
+# Lines are yielded in chunks of this many lines.
+_CHUNK_LINES = 1024
+
+
+def format_string(s: str) -> str:
+    """Quote and escape `s` as DCS does. The inverse of parse_normal_string."""
+    return '"' + s.translate(_STRING_ESCAPES) + '"'
+
+
+def _format_float(value: float) -> str:
+    if not math.isfinite(value):
+        raise ValueError(f"cannot convert {value!r} to Lua")
+    # Lua 5.1's tostring, which DCS uses to write numbers.
+    return "%.14g" % value
+
+
+def _format_bool(value: bool) -> str:
+    return "true" if value else "false"
+
+
+def _format_nil(value: None) -> str:
+    return "nil"
+
+
+# Formats the literals of each scalar type, in the order that they are checked
+# for instances of subclasses.
+_SCALAR_FORMATTERS = {
+    type(None): _format_nil,
+    bool: _format_bool,
+    str: format_string,
+    int: str,
+    float: _format_float,
+}
+
+
+def format_scalar(value: Any) -> str:
+    """Return the Lua literal for nil, a boolean, number or string."""
+    formatter = _SCALAR_FORMATTERS.get(type(value))
+    if formatter is None:
+        for scalar_type, formatter in _SCALAR_FORMATTERS.items():
+            if isinstance(value, scalar_type):
+                break
+        else:
+            raise TypeError(f"cannot convert {type(value).__name__} to Lua")
+        if scalar_type is int:
+            # e.g. an IntEnum, whose str() is its name.
+            return str(int(value))
+    return formatter(value)
+
+
+def _is_table(value: Any) -> bool:
+    return isinstance(value, (collections.abc.Mapping, list, tuple))
+
+
+def _table_items(table) -> Iterator:
+    if isinstance(table, collections.abc.Mapping):
+        return iter(table.items())
+    return enumerate(table, 1)
+
+
+def _format_key(key: Any) -> str:
+    if key is None:
+        raise ValueError("table keys cannot be None")
+    return "[" + format_scalar(key) + "]"
+
+
+def _iter_table(table, indent: str, lines: List[str], keys: Dict) -> Iterator[str]:
+    """Append the lines for the fields of `table` to `lines`, yielding them in
+    chunks as they accumulate. `keys` caches the formatted string keys."""
+    formatters = _SCALAR_FORMATTERS
+    # (items, indent, key for the "end of" comment) for the current table and
+    # the tables that contain it. Nested tables are written without recursion.
+    stack = [(_table_items(table), indent, None)]
+    while stack:
+        items, indent, table_key = stack[-1]
+        for key, item in items:
+            if type(key) is str:
+                formatted = keys.get(key)
+                if formatted is None:
+                    formatted = keys[key] = "[" + format_string(key) + "]"
+                key = formatted
+            else:
+                key = _format_key(key)
+            formatter = formatters.get(type(item))
+            if formatter is not None:
+                lines.append(f"{indent}{key} = {formatter(item)},\n")
+            elif _is_table(item):
+                lines.append(f"{indent}{key} = \n{indent}{{\n")
+                # A newline in the key would end the comment after the table.
+                comment = key.replace("\\\n", "\\n") if "\n" in key else key
+                stack.append((_table_items(item), indent + _INDENT, comment))
+                break
+            else:
+                lines.append(f"{indent}{key} = {format_scalar(item)},\n")
+        else:
+            stack.pop()
+            if table_key is not None:
+                outer = indent[: -len(_INDENT)]
+                lines.append(f"{outer}}}, -- end of {table_key}\n")
+        if len(lines) >= _CHUNK_LINES:
+            yield "".join(lines)
+            lines.clear()
+
+
+def iter_python_to_lua(namespace: Mapping[str, Any]) -> Iterator[str]:
+    """Yield the Lua source that assigns the values in `namespace`, in chunks.
+
+    Dicts and other mappings become tables with their keys in order, and
+    lists and tuples become tables with the keys 1..n. Tables are written in
+    the layout that DCS uses, with an "-- end of" comment after each, so a
+    file that DCS wrote is reproduced exactly by
+    iter_python_to_lua(lua_to_python(text)). Floats are written with 14
+    significant digits like DCS.
+    """
+    lines = []
+    # Formatted string keys, which are often repeated.
+    keys = {}
+    for name, value in namespace.items():
+        if not isinstance(name, str) or not _NAME.match(name):
+            raise ValueError(f"not a Lua name: {name!r}")
+        if not _is_table(value):
+            lines.append(f"{name} = {format_scalar(value)}\n")
+            continue
+        lines.append(f"{name} = \n{{\n")
+        yield from _iter_table(value, _INDENT, lines, keys)
+        lines.append(f"}} -- end of {name}\n")
+    if lines:
+        yield "".join(lines)
+
+
+def write_lua(namespace: Mapping[str, Any], fileobj: IO):
+    """Write the Lua source for `namespace` to a text or binary file object.
+
+    The source is written as it is generated, so it is never held in memory
+    all at once. Binary files are written as UTF-8, with any strings that
+    were not valid UTF-8 when parsed restored to their original bytes.
+    """
+    chunks = iter_python_to_lua(namespace)
+    if isinstance(fileobj, io.TextIOBase):
+        fileobj.writelines(chunks)
+    else:
+        for chunk in chunks:
+            fileobj.write(chunk.encode("utf-8", "surrogateescape"))
+
+
+def python_to_lua(namespace: Mapping[str, Any]) -> str:
+    """Return the Lua source that assigns the values in `namespace`.
+
+    See iter_python_to_lua.
+    """
+    return "".join(iter_python_to_lua(namespace))
+
+
+_LINE_INDENT = re.compile(r"[ \t]*")
+_BYTES_LINE_INDENT = re.compile(rb"[ \t]*")
+
+
+def _format_value(value: Any, source: str | _BytesLike, start: int) -> str:
+    """Format `value` to replace the value at `start` in `source`."""
+    if not _is_table(value):
+        return format_scalar(value)
+    # Indent the table like the line that it starts on.
+    if isinstance(source, str):
+        line_start = source.rfind("\n", 0, start) + 1
+        indent = _LINE_INDENT.match(source, line_start, start).group()
+    else:
+        line_start = source.rfind(b"\n", 0, start) + 1
+        indent = _BYTES_LINE_INDENT.match(source, line_start, start).group()
+        indent = indent.decode("ascii")
+    lines = ["{\n"]
+    chunks = list(_iter_table(value, indent + _INDENT, lines, {}))
+    return "".join(chunks) + "".join(lines) + indent + "}"
+
+
+def _matches(pattern: Tuple, path: Tuple) -> bool:
+    """Return whether `pattern` matches `path` or a table that contains it.
+    Either may contain "*"."""
+    return len(pattern) <= len(path) and all(
+        p == _ANY or key == _ANY or p == key for p, key in zip(pattern, path)
+    )
+
+
+def patch_lua(source: str | _BytesLike, changes: Mapping[Any, Any]) -> str | bytes:
+    """Return `source` with the values at the paths in `changes` replaced.
+
+    `changes` maps key paths, as for lua_to_python's `select`, to new values.
+    A path containing "*" changes every value that it matches. The source is
+    scanned once with the fast engine, skipping the tables that contain no
+    changes, and only the text of the changed values is replaced, so the rest
+    of `source` is kept byte for byte. Tables are written in the layout of
+    python_to_lua, indented like the line that they start on.
+
+    Returns a str if `source` is a str and bytes otherwise. Raises KeyError
+    for a path without "*" that is not in `source`, and ValueError if one
+    path contains another e.g. "mission.weather" and "mission.weather.qnh".
+    A path without "*" takes precedence over the paths with "*" that match
+    the same value, and otherwise later paths take precedence.
+    """
+    if isinstance(source, memoryview):
+        source = source.tobytes()
+    exact = {}
+    patterns = []
+    for path, value in changes.items():
+        keys = _path_keys(path)
+        if _ANY in keys:
+            patterns.append((keys, value))
+        else:
+            exact[keys] = value
+    all_keys = [*exact, *(keys for keys, _ in patterns)]
+    prefixes = {keys[:i]: keys for keys in exact for i in range(1, len(keys))}
+    for keys in exact:
+        if keys in prefixes:
+            raise ValueError(f"overlapping paths: {keys!r} and {prefixes[keys]!r}")
+    for pattern, _ in patterns:
+        for keys in all_keys:
+            if len(pattern) < len(keys) and _matches(pattern, keys):
+                raise ValueError(f"overlapping paths: {pattern!r} and {keys!r}")
+            if len(keys) < len(pattern) and _matches(keys, pattern):
+                raise ValueError(f"overlapping paths: {keys!r} and {pattern!r}")
+
+    spans = {}
+    lua_to_python(source, engine="fast", select=all_keys, intern="none", spans=spans)
+    missing = exact.keys() - spans.keys()
+    if missing:
+        raise KeyError(next(iter(missing)))
+
+    replacements = []
+    for path, (start, end) in spans.items():
+        value = exact.get(path, _MISSING)
+        if value is _MISSING:
+            # The last matching pattern takes precedence.
+            for keys, pattern_value in reversed(patterns):
+                if len(keys) == len(path) and _matches(keys, path):
+                    value = pattern_value
+                    break
+        replacements.append((start, end, _format_value(value, source, start)))
+    replacements.sort()
+
+    parts = []
+    pos = 0
+    for start, end, text in replacements:
+        parts.append(source[pos:start])
+        parts.append(text)
+        pos = end
+    parts.append(source[pos:])
+    if isinstance(source, str):
+        return "".join(parts)
+    parts[1::2] = [text.encode("utf-8", "surrogateescape") for text in parts[1::2]]
+    return b"".join(parts)
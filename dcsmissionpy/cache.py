@@ -0,0 +1,179 @@
+import collections
+import hashlib
+import os
+import pickle
+import threading
+from typing import Any, Hashable
+
+# Bump when the parser output for the same input changes, so that entries
+# written by an older version are never returned.
+_FORMAT_VERSION = 2
+
+_SUFFIX = ".pickle"
+
+CacheInfo = collections.namedtuple(
+    "CacheInfo", ["hits", "misses", "maxsize", "currsize"]
+)
+
+
+class ParseCache:
+    """An on-disk cache of parsed Lua files.
+
+    Entries are pickled into `directory`. When the total size of the entries
+    exceeds `max_size` bytes the least recently used ones are removed. Only
+    point this at a directory you trust, as entries are unpickled when read.
+    """
+
+    def __init__(self, directory: str, max_size: int = 256 * 1024 * 1024):
+        self._directory = directory
+        self._max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        return f"<ParseCache({self._directory!r}, max_size={self._max_size!r})>"
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    @staticmethod
+    def key(fingerprint: str, **options) -> str:
+        """Return the key for a file with the given content fingerprint.
+
+        `options` are the arguments the file was parsed with.
+        """
+        h = hashlib.blake2b(digest_size=20)
+        h.update(repr((_FORMAT_VERSION, fingerprint, sorted(options.items()))).encode())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self._directory, key + _SUFFIX)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return default
+        except (EOFError, pickle.UnpicklingError):
+            self._remove(path)
+            return default
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key: str, value: Any):
+        import tempfile  # Slow to import and only needed when writing.
+
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self._evict()
+
+    def clear(self):
+        for entry in self._entries():
+            self._remove(entry.path)
+
+    def _entries(self):
+        with os.scandir(self._directory) as it:
+            return [e for e in it if e.name.endswith(_SUFFIX) and e.is_file()]
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self._max_size:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class NamespaceCache:
+    """A thread-safe in-memory LRU cache of parsed Lua files.
+
+    At most `maxsize` entries are kept; setting `maxsize` to 0 disables the
+    cache. Cached values are shared, so they must not be modified.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self._maxsize = maxsize
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def __repr__(self):
+        return f"<NamespaceCache(maxsize={self._maxsize!r})>"
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, maxsize: int):
+        with self._lock:
+            self._maxsize = maxsize
+            self._evict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self._misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(
+                self._hits, self._misses, self._maxsize, len(self._entries)
+            )
+
+    def cache_clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._misses = 0
+
+    def _evict(self):
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+
+# Shared by all Mission objects.
+namespace_cache = NamespaceCache()
@@ -1,10 +1,76 @@
+from array import array
+import contextlib
 import functools
+import hashlib
 import io
+import math
+import mmap
 import os.path
-from typing import Iterator, List, IO, Tuple
+from typing import Dict, Iterator, List, IO, NamedTuple, Tuple
 import zipfile
 
 from dcsmissionpy import _parser
+from dcsmissionpy.cache import ParseCache, namespace_cache
+
+# The parts of the "mission" file used by the summary properties e.g. `sortie`.
+_MISSION_SUMMARY_PATHS = [
+    "mission.theatre",
+    "mission.sortie",
+    "mission.descriptionText",
+    "mission.descriptionBlueTask",
+    "mission.pictureFileNameB",
+]
+
+_GROUP_CATEGORIES = ("plane", "helicopter", "vehicle", "ship", "static")
+_POINT_COLUMNS = ("x", "y", "alt", "speed", "ETA")
+_UNIT_COLUMNS = ("x", "y", "heading")
+
+_GROUP_PATH = "mission.coalition.*.country.*.*.group.*."
+
+# The parts of the "mission" file used by `Mission.group_arrays`.
+_GROUP_ARRAY_PATHS = [
+    "mission.coalition.*.country.*.name",
+    _GROUP_PATH + "groupId",
+    _GROUP_PATH + "name",
+    *(_GROUP_PATH + "route.points.*." + column for column in _POINT_COLUMNS),
+    *(_GROUP_PATH + "units.*." + column for column in _UNIT_COLUMNS),
+]
+
+_MISSING = object()
+
+
+class Columns(dict):
+    """Maps column names to array("d") columns. Missing values are NaN."""
+
+    def numpy(self) -> Dict[str, "numpy.ndarray"]:
+        """Return NumPy views of the columns, without copying them.
+
+        Requires NumPy to be installed.
+        """
+        import numpy
+
+        return {name: numpy.frombuffer(column) for name, column in self.items()}
+
+
+def _columns(tables: Dict, names: Tuple[str, ...]) -> Columns:
+    rows = tables.values()
+    return Columns(
+        (name, array("d", [row.get(name, math.nan) for row in rows])) for name in names
+    )
+
+
+class GroupArrays(NamedTuple):
+    """The coordinates of a group's route points and units."""
+
+    coalition: str
+    country: str
+    category: str
+    group_id: int
+    name: str
+    # The columns "x", "y", "alt", "speed" and "ETA".
+    points: Columns
+    # The columns "x", "y" and "heading".
+    units: Columns
 
 
 class Mission:
@@ -13,10 +79,12 @@ class Mission:
         mission_path: str,
         official_mission: bool = False,
         official_mission_type: str | None = None,
+        parse_cache: ParseCache | None = None,
     ):
         self._mission_path = mission_path
         self._official_mission = official_mission
         self._official_mission_type = official_mission_type
+        self._parse_cache = parse_cache
 
         if os.path.splitext(self._mission_path)[1] in [".zip", ".miz"]:
             self._zfile = zipfile.ZipFile(self._mission_path)
@@ -33,23 +101,108 @@ class Mission:
         else:
             return open(os.path.join(self._mission_path, path), "r" if text else "rb")
 
-    @property
-    @functools.cache
+    def _read(self, path) -> bytes:
+        """Return the contents of a Lua file in the mission."""
+        if self._zfile:
+            return self._zfile.read(path)
+        with open(os.path.join(self._mission_path, path), "rb") as f:
+            return f.read()
+
+    @contextlib.contextmanager
+    def _map(self, path) -> Iterator[bytes | mmap.mmap]:
+        """Memory-map a Lua file in the mission for one parse.
+
+        Files in an unpacked mission directory are memory-mapped, so only the
+        pages that the parser looks at are read and the OS page cache is shared
+        between processes. The mapping is closed on exit, so that the file can
+        be overwritten (on Windows a mapped file cannot be), and must not be
+        kept e.g. by lazy results.
+        """
+        if self._zfile:
+            yield self._zfile.read(path)
+            return
+        with open(os.path.join(self._mission_path, path), "rb") as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # Empty files cannot be mapped.
+                yield b""
+                return
+        try:
+            yield data
+        finally:
+            try:
+                data.close()
+            except BufferError:
+                # The traceback of an exception still references the parser.
+                # The mapping is closed when the traceback is freed.
+                pass
+
+    def _parse(self, path, **kwargs):
+        """Parse a Lua file in the mission.
+
+        Results are shared between Mission objects through `namespace_cache`,
+        keyed by the file's path, CRC (in a .miz), size and modification time.
+        """
+        if self._zfile:
+            info = self._zfile.getinfo(path)
+            crc, size = info.CRC, info.file_size
+            mtime = os.stat(self._mission_path).st_mtime_ns
+        else:
+            stat = os.stat(os.path.join(self._mission_path, path))
+            crc, size, mtime = None, stat.st_size, stat.st_mtime_ns
+        key = (
+            os.path.abspath(self._mission_path),
+            path,
+            crc,
+            size,
+            mtime,
+            repr(sorted(kwargs.items())),
+        )
+        result = namespace_cache.get(key, _MISSING)
+        if result is _MISSING:
+            result = self._parse_uncached(path, **kwargs)
+            namespace_cache.set(key, result)
+        return result
+
+    def _parse_uncached(self, path, **kwargs):
+        if kwargs.get("lazy"):
+            # Lazy results are shared through `namespace_cache` and keep a
+            # reference to the text, so it is read rather than mapped.
+            return _parser.lua_to_python(self._read(path), **kwargs)
+        if self._parse_cache is None:
+            with self._map(path) as data:
+                return _parser.lua_to_python(data, **kwargs)
+        if self._zfile:
+            data = None
+            info = self._zfile.getinfo(path)
+            fingerprint = f"crc32:{info.CRC:08x}:{info.file_size}"
+        else:
+            data = self._read(path)
+            fingerprint = "blake2b:" + hashlib.blake2b(data).hexdigest()
+        key = self._parse_cache.key(fingerprint, **kwargs)
+        result = self._parse_cache.get(key, _MISSING)
+        if result is _MISSING:
+            if data is None:
+                data = self._read(path)
+            result = _parser.lua_to_python(data, **kwargs)
+            self._parse_cache.set(key, result)
+        return result
+
+    @functools.cached_property
     def _mission_namespace(self):
-        with self._open("mission") as f:
-            return _parser.lua_to_python(f.read())
+        return self._parse("mission", lazy=True)
 
-    @property
-    @functools.cache
+    @functools.cached_property
+    def _mission_summary_namespace(self):
+        return self._parse("mission", select=_MISSION_SUMMARY_PATHS)
+
+    @functools.cached_property
     def _dictionary_namespace(self):
-        with self._open("l10n/DEFAULT/dictionary") as f:
-            return _parser.lua_to_python(f.read())
+        return self._parse("l10n/DEFAULT/dictionary")
 
-    @property
-    @functools.cache
+    @functools.cached_property
     def _map_resource_namespace(self):
-        with self._open("l10n/DEFAULT/mapResource") as f:
-            return _parser.lua_to_python(f.read())
+        return self._parse("l10n/DEFAULT/mapResource")
 
     def __repr__(self):
         return f"<Mission({self._mission_path!r})"
@@ -71,33 +224,67 @@ class Mission:
 
     @property
     def theatre(self) -> str:
-        if "theatre" in self._mission_namespace["mission"]:
-            return self._mission_namespace["mission"]["theatre"]
+        if "theatre" in self._mission_summary_namespace["mission"]:
+            return self._mission_summary_namespace["mission"]["theatre"]
         else:
-            print(self._mission_namespace.keys())
             with self._open("theatre") as f:
                 return f.read()
 
     @property
     def sortie(self):
-        key = self._mission_namespace["mission"]["sortie"]
+        key = self._mission_summary_namespace["mission"]["sortie"]
         return self._dictionary_namespace["dictionary"][key]
 
     @property
     def description(self):
-        key = self._mission_namespace["mission"]["descriptionText"]
+        key = self._mission_summary_namespace["mission"]["descriptionText"]
         return self._dictionary_namespace["dictionary"][key]
 
     @property
     def blue_task_description(self):
-        key = self._mission_namespace["mission"]["descriptionBlueTask"]
+        key = self._mission_summary_namespace["mission"]["descriptionBlueTask"]
         return self._dictionary_namespace["dictionary"][key]
 
     @property
     def briefing_image_paths(self) -> List[str]:
-        keys = self._mission_namespace["mission"].get("pictureFileNameB", {})
+        keys = self._mission_summary_namespace["mission"].get("pictureFileNameB", {})
         return [self._map_resource_namespace["mapResource"][v] for v in keys.values()]
 
+    def iterparse_mission(self) -> Iterator[Tuple]:
+        """Yield the _parser.iterparse_lua events for the "mission" file."""
+        with self._open("mission", text=False) as f:
+            yield from _parser.iterparse_lua(f)
+
+    def iterparse_warehouses(self) -> Iterator[Tuple]:
+        """Yield the _parser.iterparse_lua events for the "warehouses" file."""
+        with self._open("warehouses", text=False) as f:
+            yield from _parser.iterparse_lua(f)
+
+    def group_arrays(self) -> Iterator[GroupArrays]:
+        """Yield the route point and unit coordinates of each group as columns.
+
+        Only the keys needed for the columns are parsed.
+        """
+        namespace = self._parse("mission", select=_GROUP_ARRAY_PATHS)
+        coalitions = namespace.get("mission", {}).get("coalition", {})
+        for coalition_name, coalition in coalitions.items():
+            for country in coalition.get("country", {}).values():
+                for category in _GROUP_CATEGORIES:
+                    groups = country.get(category, {}).get("group", {})
+                    for group in groups.values():
+                        yield GroupArrays(
+                            coalition_name,
+                            country.get("name"),
+                            category,
+                            group.get("groupId"),
+                            group.get("name"),
+                            _columns(
+                                group.get("route", {}).get("points", {}),
+                                _POINT_COLUMNS,
+                            ),
+                            _columns(group.get("units", {}), _UNIT_COLUMNS),
+                        )
+
     @property
     def briefing_images(self) -> Iterator[Tuple[str, bytes]]:
         for path in self.briefing_image_paths:
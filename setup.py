@@ -46,6 +46,7 @@ setup(
             "nox",
             "pytest>=7.4.2",
         ],
+        "numpy": ["numpy"],
     },
     license="Apache-2.0",
     packages=["dcsmissionpy", "dcsmissionpy._lua_parser"],
@@ -0,0 +1,154 @@
+import os
+import os.path
+import shutil
+import zipfile
+
+import pytest
+
+import dcsmissionpy
+from dcsmissionpy import _parser
+
+_MIZ_PATH = os.path.join(os.path.dirname(__file__), "harpoon-radar.miz")
+
+
+@pytest.fixture(autouse=True)
+def clear_namespace_cache():
+    dcsmissionpy.namespace_cache.cache_clear()
+    yield
+    dcsmissionpy.namespace_cache.cache_clear()
+
+
+@pytest.fixture
+def parse_cache(tmp_path):
+    return dcsmissionpy.ParseCache(str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def no_parsing(monkeypatch):
+    def lua_to_python(*args, **kwargs):
+        raise AssertionError("parsed")
+
+    def disable():
+        monkeypatch.setattr(_parser, "lua_to_python", lua_to_python)
+
+    return disable
+
+
+def _summary(mission):
+    return (
+        mission.sortie,
+        mission.theatre,
+        mission.description,
+        mission.blue_task_description,
+        mission.briefing_image_paths,
+    )
+
+
+def test_get_set(parse_cache):
+    key = parse_cache.key("fingerprint", select=["a"])
+    assert key != parse_cache.key("fingerprint")
+    assert key != parse_cache.key("other", select=["a"])
+    assert parse_cache.get(key) is None
+    parse_cache.set(key, {"a": {1: "x"}})
+    assert parse_cache.get(key) == {"a": {1: "x"}}
+    parse_cache.clear()
+    assert parse_cache.get(key, "missing") == "missing"
+
+
+def test_corrupt_entry(parse_cache):
+    key = parse_cache.key("fingerprint")
+    parse_cache.set(key, 1)
+    with open(os.path.join(parse_cache.directory, key + ".pickle"), "wb") as f:
+        f.write(b"garbage")
+    assert parse_cache.get(key) is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    parse_cache = dcsmissionpy.ParseCache(str(tmp_path), max_size=2500)
+    value = "x" * 1000
+    for i, key in enumerate(["a", "b", "c"]):
+        parse_cache.set(key, value)
+        path = os.path.join(str(tmp_path), key + ".pickle")
+        os.utime(path, ns=(i * 10**9, i * 10**9))
+        if key == "b":
+            assert parse_cache.get("a") == value  # "a" is now the newest.
+    assert parse_cache.get("a") == value
+    assert parse_cache.get("b") is None
+    assert parse_cache.get("c") == value
+
+
+def test_mission_warm_run_skips_parsing(parse_cache, no_parsing):
+    expected = _summary(dcsmissionpy.Mission(_MIZ_PATH, parse_cache=parse_cache))
+    dcsmissionpy.namespace_cache.cache_clear()
+    no_parsing()
+    assert (
+        _summary(dcsmissionpy.Mission(_MIZ_PATH, parse_cache=parse_cache)) == expected
+    )
+
+
+def test_directory_mission_invalidation(tmp_path, parse_cache, no_parsing):
+    mission_path = str(tmp_path / "mission")
+    with zipfile.ZipFile(_MIZ_PATH) as zfile:
+        zfile.extractall(mission_path)
+    expected = _summary(dcsmissionpy.Mission(mission_path, parse_cache=parse_cache))
+
+    dcsmissionpy.namespace_cache.cache_clear()
+    copy_path = str(tmp_path / "copy")
+    shutil.copytree(mission_path, copy_path)
+    no_parsing()
+    mission = dcsmissionpy.Mission(copy_path, parse_cache=parse_cache)
+    assert _summary(mission) == expected
+
+    dictionary_path = os.path.join(copy_path, "l10n", "DEFAULT", "dictionary")
+    with open(dictionary_path, "rb") as f:
+        dictionary = f.read()
+    with open(dictionary_path, "wb") as f:
+        f.write(dictionary.replace(b"Harpoon Radar Engagement", b"Changed"))
+    with pytest.raises(AssertionError, match="parsed"):
+        dcsmissionpy.Mission(copy_path, parse_cache=parse_cache).sortie
+
+
+def test_namespace_cache():
+    namespace_cache = dcsmissionpy.NamespaceCache(maxsize=2)
+    namespace_cache.set("a", 1)
+    namespace_cache.set("b", 2)
+    assert namespace_cache.get("a") == 1
+    namespace_cache.set("c", 3)
+    assert namespace_cache.get("b") is None
+    assert namespace_cache.get("c") == 3
+    assert namespace_cache.cache_info() == (2, 1, 2, 2)
+    namespace_cache.maxsize = 1
+    assert namespace_cache.get("a") is None
+    assert namespace_cache.cache_info().currsize == 1
+    namespace_cache.cache_clear()
+    assert namespace_cache.cache_info() == (0, 0, 1, 0)
+
+
+def test_missions_share_namespaces(no_parsing):
+    expected = _summary(dcsmissionpy.Mission(_MIZ_PATH))
+    info = dcsmissionpy.namespace_cache.cache_info()
+    assert info.hits == 0
+    assert info.currsize == 3
+    no_parsing()
+    assert _summary(dcsmissionpy.Mission(_MIZ_PATH)) == expected
+    assert dcsmissionpy.namespace_cache.cache_info().hits == 3
+
+
+def test_namespace_cache_invalidation(tmp_path):
+    mission_path = str(tmp_path / "mission")
+    with zipfile.ZipFile(_MIZ_PATH) as zfile:
+        zfile.extractall(mission_path)
+    assert dcsmissionpy.Mission(mission_path).sortie == "Harpoon Radar Engagement"
+
+    dictionary_path = os.path.join(mission_path, "l10n", "DEFAULT", "dictionary")
+    with open(dictionary_path, "rb") as f:
+        dictionary = f.read()
+    with open(dictionary_path, "wb") as f:
+        f.write(dictionary.replace(b"Harpoon Radar Engagement", b"Changed"))
+    assert dcsmissionpy.Mission(mission_path).sortie == "Changed"
+
+
+def test_namespace_cache_disabled(monkeypatch):
+    monkeypatch.setattr(dcsmissionpy.namespace_cache, "maxsize", 0)
+    dcsmissionpy.Mission(_MIZ_PATH).sortie
+    assert dcsmissionpy.namespace_cache.cache_info().currsize == 0
@@ -0,0 +1,57 @@
+import importlib.util
+import re
+import subprocess
+import sys
+
+import pytest
+
+# The cumulative time that `import dcsmissionpy` may take, in microseconds.
+# Importing the package before the slow modules were deferred took about
+# 130ms and it now takes about half of that. The budget adds a margin of half
+# of the old cost for slow CI machines. Regressions are caught
+# deterministically by checking for the slow modules below.
+_IMPORT_BUDGET_US = 125_000
+
+# Modules that are slow to import and only needed by some functions.
+_DEFERRED_MODULES = [
+    "antlr4",
+    "dcsmissionpy._lua_parser",
+    "concurrent.futures",
+    "dataclasses",
+]
+
+
+@pytest.mark.skipif(
+    importlib.util.find_spec("winreg") is None, reason="dcsmissionpy requires winreg"
+)
+def test_import_does_not_load_deferred_modules():
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, dcsmissionpy; print(*sys.modules)",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = set(result.stdout.split())
+    assert "dcsmissionpy" in loaded
+    assert loaded.isdisjoint(_DEFERRED_MODULES)
+
+
+@pytest.mark.skipif(
+    importlib.util.find_spec("winreg") is None, reason="dcsmissionpy requires winreg"
+)
+def test_import_time():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import dcsmissionpy"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    match = re.search(
+        r"^import time:\s+\d+ \|\s+(\d+) \| dcsmissionpy$", result.stderr, re.M
+    )
+    assert match, result.stderr
+    assert int(match.group(1)) < _IMPORT_BUDGET_US
@@ -1,5 +1,9 @@
+from array import array
+import mmap
 import os.path
+import tempfile
 import unittest
+import zipfile
 
 import pytest
 
@@ -31,12 +35,64 @@ class MissionTests(unittest.TestCase):
             == "Sink the enemy cargo skip that is about 15nm to your west."
         )
 
+    def test_iterparse_mission(self):
+        for event in self.mission.iterparse_mission():
+            if event[:2] == ("scalar", ("mission", "theatre")):
+                assert event[2] == "Caucasus"
+                break
+        else:
+            self.fail("theatre not found")
+
+    def test_iterparse_warehouses(self):
+        events = list(self.mission.iterparse_warehouses())
+        assert events[0] == ("start_table", ("warehouses",))
+        assert events[-1] == ("end_table", ("warehouses",))
+
+    def test_group_arrays(self):
+        player, naval = self.mission.group_arrays()
+        assert player[:5] == ("blue", "USA", "plane", 1, "Player")
+        assert player.points["alt"] == array("d", [4572.0, 4572.0])
+        assert player.points["ETA"][0] == 0.0
+        assert player.units["x"] == array("d", [-313301.99949128])
+        assert naval[:5] == ("red", "USSR", "ship", 3, "Naval-2")
+        assert len(naval.points["speed"]) == 2
+        assert list(naval.units) == ["x", "y", "heading"]
+
+    def test_group_arrays_numpy(self):
+        numpy = pytest.importorskip("numpy")
+        player = next(self.mission.group_arrays())
+        points = player.points.numpy()
+        assert points["alt"].dtype == numpy.float64
+        assert points["alt"].tolist() == [4572.0, 4572.0]
+
     def test_briefing_images(self):
         for path, image in self.mission.briefing_images:
             assert path == "harpoon-radar-mission.png"
             assert image.startswith(b"\x89PNG")
 
 
+class DirectoryMissionTests(MissionTests):
+    def setUp(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        # Cached results must not keep the files in tmpdir open.
+        self.addCleanup(dcsmissionpy.namespace_cache.cache_clear)
+        with zipfile.ZipFile(
+            os.path.join(os.path.dirname(__file__), "harpoon-radar.miz")
+        ) as zfile:
+            zfile.extractall(tmpdir.name)
+        self.mission = dcsmissionpy.Mission(tmpdir.name)
+
+    def test_files_are_memory_mapped_for_one_parse(self):
+        with self.mission._map("mission") as data:
+            assert isinstance(data, mmap.mmap)
+        assert data.closed
+        # Lazy results are shared, so they must not keep the mapping open.
+        mission = self.mission._mission_namespace["mission"]
+        assert isinstance(mission._text, bytes)
+        assert "blue" in mission["coalition"]
+
+
 @pytest.mark.skipif(
     not dcsmissionpy.is_dcs_installed(), reason="DCS World not installed"
 )
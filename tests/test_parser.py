@@ -1,51 +1,88 @@
-from dcsmissionpy._parser import lua_to_python
+import concurrent.futures
+import dataclasses
+import functools
+import io
+import math
+import pickle
+import threading
 
+import pytest
 
-def test_true_assignment():
+from dcsmissionpy import _parser
+from dcsmissionpy._lua_parser.LuaParser import LuaParser
+
+
+@pytest.fixture(params=["fast", "antlr"])
+def lua_to_python(request):
+    return functools.partial(_parser.lua_to_python, engine=request.param)
+
+
+def test_true_assignment(lua_to_python):
     assert lua_to_python(r"happy = true") == {"happy": True}
 
 
-def test_false_assignment():
+def test_false_assignment(lua_to_python):
     assert lua_to_python(r"sad = false") == {"sad": False}
 
 
-def test_nil_assignment():
+def test_nil_assignment(lua_to_python):
     assert lua_to_python(r"pet = nil") == {"pet": None}
 
 
-def test_float_assignment():
+def test_float_assignment(lua_to_python):
     assert lua_to_python(r"gravity = 9.8") == {"gravity": 9.8}
 
 
-def test_int_assignment():
+def test_int_assignment(lua_to_python):
     assert lua_to_python(r"dozen = 12") == {"dozen": 12}
 
 
-def test_normal_string_assignment():
+def test_normal_string_assignment(lua_to_python):
     assert lua_to_python(r'name = "Brian"') == {"name": "Brian"}
 
 
-def test_normal_string_assignment_line_continuation():
+def test_normal_string_assignment_line_continuation(lua_to_python):
     assert lua_to_python('name = "Brian\\\r\nQuinlan"') == {"name": "Brian\nQuinlan"}
     assert lua_to_python('name = "Brian\\\nQuinlan"') == {"name": "Brian\nQuinlan"}
 
 
-def test_normal_string_assignment_escaped_quotes():
+def test_normal_string_assignment_escaped_quotes(lua_to_python):
     assert lua_to_python('name = "\\"Hello World\\""') == {"name": '"Hello World"'}
     assert lua_to_python('''name = "\\'Hello World\\'"''') == {"name": "'Hello World'"}
 
 
-def test_normal_string_assignment_escape_backslash():
+def test_normal_string_assignment_escape_backslash(lua_to_python):
     assert lua_to_python('escape = "\\\\"') == {"escape": "\\"}
 
 
-def test_normal_string_assignment_escapes():
+def test_normal_string_assignment_escapes(lua_to_python):
     assert lua_to_python('escape = "\\a"') == {"escape": "\a"}
     assert lua_to_python('escape = "\\b"') == {"escape": "\b"}
     assert lua_to_python('escape = "\\n"') == {"escape": "\n"}
+    assert lua_to_python('escape = "\\f\\r\\t\\v"') == {"escape": "\f\r\t\v"}
+
 
+def test_normal_string_assignment_numeric_escapes(lua_to_python):
+    assert lua_to_python(r'escape = "\65\066\0677"') == {"escape": "ABC7"}
+    assert lua_to_python(r'escape = "\x41\x4a"') == {"escape": "AJ"}
+    # UTF-8 encoded bytes.
+    assert lua_to_python(r'escape = "\208\159\xd1\x80"') == {"escape": "Пр"}
+    assert lua_to_python(r'escape = "\xff"') == {"escape": "\udcff"}
 
-def test_var_args():
+
+def test_normal_string_assignment_unicode_escape(lua_to_python):
+    assert lua_to_python(r'escape = "\u{41}\u{41F}\u{1F600}"') == {
+        "escape": "A\u041f\U0001f600"
+    }
+
+
+def test_normal_string_assignment_skip_whitespace(lua_to_python):
+    assert lua_to_python('escape = "Hello \\z\n    World"') == {
+        "escape": "Hello World"
+    }
+
+
+def test_var_args(lua_to_python):
     assert lua_to_python(r'name, age, male = "Brian", 48, true') == {
         "name": "Brian",
         "age": 48,
@@ -53,51 +90,51 @@ def test_var_args():
     }
 
 
-def test_unary_minus():
+def test_unary_minus(lua_to_python):
     assert lua_to_python(r"gravity = -9.8") == {"gravity": -9.8}
     assert lua_to_python(r"gravity = -9") == {"gravity": -9}
 
 
-def test_binary_plus():
+def test_binary_plus(lua_to_python):
     assert lua_to_python(r"sum = 1+2+3") == {"sum": 6}
 
 
-def test_binary_minus():
+def test_binary_minus(lua_to_python):
     assert lua_to_python(r"sum = 3-2-1") == {"sum": 0}
 
 
-def test_binary_multiply():
+def test_binary_multiply(lua_to_python):
     assert lua_to_python(r"product = 1*2*3") == {"product": 6}
 
 
-def test_binary_divide():
+def test_binary_divide(lua_to_python):
     assert lua_to_python(r"quotient = 6/3/2") == {"quotient": 1}
 
 
-def test_math_parenthesis():
+def test_math_parenthesis(lua_to_python):
     assert lua_to_python(r"result = 2*(3+5)/4+1") == {"result": 5}
 
 
-def test_math_order_of_operations():
+def test_math_order_of_operations(lua_to_python):
     assert lua_to_python(r"result = 3+2*5") == {"result": 13}
     assert lua_to_python(r"result = 3*2+5") == {"result": 11}
     assert lua_to_python(r"result = 2+4*(5-1)") == {"result": 18}
     assert lua_to_python(r"result = 2*4+(5-1)") == {"result": 12}
 
 
-def test_expression_key_table():
+def test_expression_key_table(lua_to_python):
     assert (lua_to_python(r'gravity = {["earth"] = 9.8; ["mars"] = 4.7}')) == {
         "gravity": {"earth": 9.8, "mars": 4.7}
     }
 
 
-def test_list_table():
+def test_list_table(lua_to_python):
     assert (lua_to_python(r'fruit = {"apple", "banana", "cantaloupe"}')) == {
         "fruit": {1: "apple", 2: "banana", 3: "cantaloupe"}
     }
 
 
-def test_table_mixed():
+def test_table_mixed(lua_to_python):
     assert (
         lua_to_python(
             r"""fruits_and_animals = {
@@ -119,18 +156,16 @@ def test_table_mixed():
     )
 
 
-def test_use_variable_in_expression():
+def test_use_variable_in_expression(lua_to_python):
     assert (lua_to_python(r'greeting = "hello"; again = greeting')) == {
         "greeting": "hello",
         "again": "hello",
     }
     assert (lua_to_python(r"c = 25; f = c * 9 / 5 + 32")) == {"c": 25, "f": 77.0}
+    assert (lua_to_python(r"c = 25; f = (c * 9 / 5) + 32")) == {"c": 25, "f": 77.0}
 
 
-def test_ignore_funct():
-    assert (
-        lua_to_python(
-            r"""
+_FUNCTION_SOURCE = r"""
 
 a = "value1"
 function f(a,b)
@@ -139,12 +174,35 @@ function f(a,b)
 end
 c = "value3"
 """
-        )
-        == {"a": "value1", "c": "value3"}
-    )
 
 
-def test_multiple_string_assignment():
+@pytest.mark.parametrize("engine", ["auto", "antlr"])
+def test_ignore_funct(engine):
+    assert _parser.lua_to_python(_FUNCTION_SOURCE, engine=engine) == {
+        "a": "value1",
+        "c": "value3",
+    }
+
+
+@pytest.mark.parametrize("engine", ["auto", "antlr"])
+def test_syntax_errors(engine):
+    # The ANTLR parser recovers from errors, keeping the valid assignments.
+    for source, expected in [
+        ("x = 1 foo", {"x": 1}),
+        ("Caucasus", {}),
+        ("x = ", {}),
+        ("x = (", {}),
+        ("x = 1 y = {2,} foo z = 3", {"x": 1, "y": {1: 2}, "z": 3}),
+    ]:
+        assert _parser.lua_to_python(source, engine=engine) == expected
+
+
+def test_fast_engine_unsupported_syntax():
+    with pytest.raises(_parser.UnsupportedSyntaxError):
+        _parser.lua_to_python(_FUNCTION_SOURCE, engine="fast")
+
+
+def test_multiple_string_assignment(lua_to_python):
     assert (
         lua_to_python(
             r"""
@@ -156,7 +214,7 @@ string2 = "value2"
     )
 
 
-def test_multiple_boolean_assignment():
+def test_multiple_boolean_assignment(lua_to_python):
     assert (
         lua_to_python(
             r"""
@@ -188,3 +246,702 @@ mission =
 {
     ["requiredModules"] = 
 """
+
+
+def _token_list(text):
+    return [
+        (_parser.TOKEN_NAMES[token_type], text[start:end])
+        for token_type, start, end in _parser.tokenize(text)
+    ]
+
+
+def test_tokenize():
+    assert _token_list('mission = {["x"] = 1.5, [1] = -2, true}') == [
+        ("NAME", "mission"),
+        ("ASSIGN", "="),
+        ("LBRACE", "{"),
+        ("LBRACKET", "["),
+        ("STRING", '"x"'),
+        ("RBRACKET", "]"),
+        ("ASSIGN", "="),
+        ("FLOAT", "1.5"),
+        ("COMMA", ","),
+        ("LBRACKET", "["),
+        ("INT", "1"),
+        ("RBRACKET", "]"),
+        ("ASSIGN", "="),
+        ("MINUS", "-"),
+        ("INT", "2"),
+        ("COMMA", ","),
+        ("TRUE", "true"),
+        ("RBRACE", "}"),
+        ("EOF", ""),
+    ]
+
+
+def test_tokenize_skips_comments():
+    text = """
+    a = 1 -- end of a
+    --[==[ a long
+    comment ]==]
+    b = nil --"""
+    assert _token_list(text) == [
+        ("NAME", "a"),
+        ("ASSIGN", "="),
+        ("INT", "1"),
+        ("NAME", "b"),
+        ("ASSIGN", "="),
+        ("NIL", "nil"),
+        ("EOF", ""),
+    ]
+
+
+def test_tokenize_other():
+    assert _token_list("if x == 0x1F then f('a') end") == [
+        ("OTHER", "if"),
+        ("NAME", "x"),
+        ("OTHER", "=="),
+        ("OTHER", "0x1F"),
+        ("OTHER", "then"),
+        ("NAME", "f"),
+        ("LPAREN", "("),
+        ("OTHER", "'"),
+        ("NAME", "a"),
+        ("OTHER", "'"),
+        ("RPAREN", ")"),
+        ("OTHER", "end"),
+        ("EOF", ""),
+    ]
+
+
+@pytest.mark.parametrize("prediction_mode", ["two_stage", "sll", "ll"])
+def test_prediction_mode(prediction_mode):
+    assert _parser.lua_to_python(
+        _FUNCTION_SOURCE, engine="antlr", prediction_mode=prediction_mode
+    ) == {"a": "value1", "c": "value3"}
+
+
+def test_unknown_prediction_mode():
+    with pytest.raises(ValueError):
+        _parser.lua_to_python("a = 1", prediction_mode="lalr")
+
+
+_SELECT_SOURCE = r"""
+version = 12
+mission = {
+    ["sortie"] = "DictKey_sortie_5",
+    ["theatre"] = "Caucasus",
+    ["coalition"] = {
+        ["blue"] = {
+            ["name"] = "blue",
+            ["country"] = {
+                [1] = {["name"] = "USA", ["id"] = 2},
+                [2] = {["name"] = "UK", ["id"] = 4},
+            },
+        },
+        ["red"] = {
+            ["name"] = "red",
+            ["country"] = {[1] = {["name"] = "Russia", ["id"] = 0}},
+        },
+    },
+    ["trig"] = {["func"] = {[1] = "if x then y() end -- }}}"}},
+}
+"""
+
+
+def test_select_scalars(lua_to_python):
+    assert lua_to_python(
+        _SELECT_SOURCE, select=["mission.sortie", "mission.theatre"]
+    ) == {"mission": {"sortie": "DictKey_sortie_5", "theatre": "Caucasus"}}
+
+
+def test_select_table(lua_to_python):
+    assert lua_to_python(_SELECT_SOURCE, select=["mission.coalition.red"]) == {
+        "mission": {
+            "coalition": {
+                "red": {
+                    "name": "red",
+                    "country": {1: {"name": "Russia", "id": 0}},
+                }
+            }
+        }
+    }
+
+
+def test_select_integer_key(lua_to_python):
+    assert lua_to_python(
+        _SELECT_SOURCE, select=["mission.coalition.blue.country.2.name"]
+    ) == {"mission": {"coalition": {"blue": {"country": {2: {"name": "UK"}}}}}}
+
+
+def test_select_wildcard(lua_to_python):
+    assert lua_to_python(
+        _SELECT_SOURCE, select=[("mission", "coalition", "*", "country", "*", "id")]
+    ) == {
+        "mission": {
+            "coalition": {
+                "blue": {"country": {1: {"id": 2}, 2: {"id": 4}}},
+                "red": {"country": {1: {"id": 0}}},
+            }
+        }
+    }
+
+
+def test_select_missing(lua_to_python):
+    assert lua_to_python(
+        _SELECT_SOURCE, select=["version", "mission.weather", "missing"]
+    ) == {"version": 12, "mission": {}}
+
+
+def test_select_skipped_variable():
+    # `b` refers to a table that was skipped so the ANTLR engine is used.
+    source = 'a = {["x"] = 1}; b = a'
+    assert _parser.lua_to_python(source, select=["b"]) == {"b": {"x": 1}}
+    with pytest.raises(_parser.UnsupportedSyntaxError):
+        _parser.lua_to_python(source, select=["b"], engine="fast")
+
+
+def test_lazy():
+    namespace = _parser.lua_to_python(_SELECT_SOURCE, lazy=True)
+    assert namespace == _parser.lua_to_python(_SELECT_SOURCE)
+    assert isinstance(namespace["mission"], _parser.LazyLuaTable)
+
+
+def test_lazy_parses_accessed_tables():
+    namespace = _parser.lua_to_python(_SELECT_SOURCE, lazy=True)
+    coalition = namespace["mission"]["coalition"]
+    assert coalition["blue"]["country"][2]["name"] == "UK"
+    assert repr(coalition["red"]).startswith("<LazyLuaTable")
+    assert repr(namespace["mission"]["trig"]).startswith("<LazyLuaTable")
+
+
+def test_lazy_variable():
+    namespace = _parser.lua_to_python("x = 1; t = {x, x * 2}; x = 3", lazy=True)
+    assert dict(namespace["t"]) == {1: 1, 2: 2}
+
+
+def test_lazy_unsupported_syntax():
+    namespace = _parser.lua_to_python('t = {["a"] = {["b"] = 1 .. 2}}', lazy=True)
+    with pytest.raises(NotImplementedError):
+        namespace["t"]["a"]["b"]
+
+
+_INTERN_SOURCE = """
+units = {
+    [1] = {["type"] = "Su-25T", ["skill"] = "High"},
+    [2] = {["type"] = "Su-25T", ["skill"] = "High"},
+}
+"""
+
+
+def test_intern_keys(lua_to_python):
+    namespace = lua_to_python(_INTERN_SOURCE)
+    units = namespace["units"]
+    key1, key2 = next(iter(units[1])), next(iter(units[2]))
+    assert key1 == key2 == "type"
+    assert key1 is key2
+    assert units[1]["type"] is not units[2]["type"]
+
+
+def test_intern_all(lua_to_python):
+    units = lua_to_python(_INTERN_SOURCE, intern="all")["units"]
+    assert units[1]["type"] is units[2]["type"]
+    assert units[1]["skill"] is units[2]["skill"]
+
+
+def test_intern_none(lua_to_python):
+    units = lua_to_python(_INTERN_SOURCE, intern="none")["units"]
+    assert units == lua_to_python(_INTERN_SOURCE)["units"]
+    assert next(iter(units[1])) is not next(iter(units[2]))
+
+
+def test_intern_lazy():
+    units = _parser.lua_to_python(_INTERN_SOURCE, lazy=True, intern="all")["units"]
+    assert next(iter(units[1])) is next(iter(units[2]))
+    assert units[1]["type"] is units[2]["type"]
+
+
+def test_unknown_intern_mode():
+    with pytest.raises(ValueError):
+        _parser.lua_to_python("a = 1", intern="values")
+
+
+_SEQUENCE_SOURCE = """
+units = {
+    [1] = {["name"] = "a", ["points"] = {[1] = {["x"] = 1}, [2] = {["x"] = 2}}},
+    [2] = {["name"] = "b", ["points"] = {}},
+}
+fruit = {"apple", "banana"}
+sparse = {[1] = "a", [3] = "c"}
+"""
+
+
+def test_sequences_list(lua_to_python):
+    assert lua_to_python(_SEQUENCE_SOURCE, sequences="list") == {
+        "units": [
+            {"name": "a", "points": [{"x": 1}, {"x": 2}]},
+            {"name": "b", "points": {}},
+        ],
+        "fruit": ["apple", "banana"],
+        "sparse": {1: "a", 3: "c"},
+    }
+
+
+def test_sequences_tuple(lua_to_python):
+    namespace = lua_to_python(_SEQUENCE_SOURCE, sequences="tuple")
+    assert namespace["fruit"] == ("apple", "banana")
+    assert namespace["units"][0]["points"] == ({"x": 1}, {"x": 2})
+
+
+def test_sequences_lua(lua_to_python):
+    namespace = lua_to_python(_SEQUENCE_SOURCE, sequences="lua")
+    assert namespace == lua_to_python(_SEQUENCE_SOURCE)
+    units = namespace["units"]
+    assert isinstance(units, _parser.LuaSequence)
+    assert units[2]["name"] == "b"
+    assert list(units) == [1, 2]
+    assert 0 not in units and 3 not in units
+    with pytest.raises(KeyError):
+        units[0]
+    assert units.get(3) is None
+    assert namespace["fruit"].values() == ("apple", "banana")
+    assert repr(namespace["fruit"]) == "LuaSequence(['apple', 'banana'])"
+
+
+def test_sequences_select(lua_to_python):
+    assert lua_to_python(
+        _SEQUENCE_SOURCE, select=["units.1.points", "fruit"], sequences="list"
+    ) == {"units": {1: {"points": [{"x": 1}, {"x": 2}]}}, "fruit": ["apple", "banana"]}
+
+
+def test_unknown_sequences_mode():
+    with pytest.raises(ValueError):
+        _parser.lua_to_python("a = 1", sequences="set")
+    with pytest.raises(ValueError):
+        _parser.lua_to_python("a = 1", sequences="list", lazy=True)
+
+
+def test_engine_reuse():
+    engine = _parser.LuaToPython()
+    for _ in range(2):
+        # A syntax error makes two-stage prediction fall back to LL prediction.
+        assert engine.lua_to_python('a = 1 x = "a" ..', engine="antlr") == {"a": 1}
+        assert engine.lua_to_python("a = 1 b = {1, 2}", engine="antlr") == {
+            "a": 1,
+            "b": {1: 1, 2: 2},
+        }
+        assert engine.lua_to_python('c = "x"', engine="antlr", prediction_mode="sll")
+        assert engine.lua_to_python(_SELECT_SOURCE, engine="antlr") == (
+            _parser.lua_to_python(_SELECT_SOURCE)
+        )
+
+
+def test_default_engine_per_thread():
+    engines = []
+    thread = threading.Thread(target=lambda: engines.append(_parser.default_engine()))
+    thread.start()
+    thread.join()
+    assert _parser.default_engine() is _parser.default_engine()
+    assert engines[0] is not _parser.default_engine()
+
+
+def test_save_and_load_antlr_dfa(tmp_path):
+    path = tmp_path / "dfa.pickle"
+    expected = _parser.lua_to_python(_SELECT_SOURCE, engine="antlr")
+    _parser.save_antlr_dfa(path)
+    state_counts = [len(dfa._states) for dfa in LuaParser.decisionsToDFA]
+    _parser.load_antlr_dfa(path)
+    assert [len(dfa._states) for dfa in LuaParser.decisionsToDFA] == state_counts
+    assert _parser.lua_to_python(_SELECT_SOURCE, engine="antlr") == expected
+    assert _parser.lua_to_python('a = 1 x = "a" ..', engine="antlr") == {"a": 1}
+
+
+def test_load_antlr_dfa_mismatch(tmp_path):
+    path = tmp_path / "dfa.pickle"
+    with open(path, "wb") as f:
+        pickle.dump(((0, "0", ""), {}), f)
+    with pytest.raises(ValueError):
+        _parser.load_antlr_dfa(path)
+
+
+def _nested_tables(depth):
+    return "t = " + '{["a"] = 1, ' * depth + "2" + "}" * depth
+
+
+def test_deeply_nested_tables():
+    table = _parser.lua_to_python(_nested_tables(500), engine="fast")["t"]
+    for _ in range(499):
+        assert table["a"] == 1
+        table = table[1]
+    assert table == {"a": 1, 1: 2}
+
+
+def test_nested_tables_positional_override(lua_to_python):
+    assert lua_to_python('t = {[1] = {"x"}, {"y"}, [1] = {"z"}}') == {
+        "t": {1: {1: "y"}}
+    }
+
+
+def test_max_depth(lua_to_python):
+    text = _nested_tables(10)
+    assert lua_to_python(text, max_depth=10)
+    with pytest.raises(_parser.NestingTooDeepError, match="more than 9 deep"):
+        lua_to_python(text, max_depth=9)
+    with pytest.raises(_parser.NestingTooDeepError):
+        lua_to_python(text, max_depth=9, select=["t.1.1.1.1.1.1.1.1.1.a"])
+    assert lua_to_python("t = {{{1}, {2}}, {3}}", max_depth=3)
+
+
+def test_max_depth_after_fallback():
+    with pytest.raises(_parser.NestingTooDeepError):
+        _parser.lua_to_python("function f() end " + _nested_tables(10), max_depth=9)
+
+
+class _CountingExecutor(concurrent.futures.ThreadPoolExecutor):
+    submitted = 0
+
+    def submit(self, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(*args, **kwargs)
+
+
+_PARALLEL_SOURCE = _SELECT_SOURCE.replace("version = 12", "")
+
+
+@pytest.mark.parametrize("engine", ["fast", "antlr"])
+@pytest.mark.parametrize("sequences", ["dict", "list"])
+def test_workers(engine, sequences):
+    expected = _parser.lua_to_python(_PARALLEL_SOURCE, sequences=sequences)
+    with _CountingExecutor(2) as executor:
+        assert (
+            _parser.lua_to_python(
+                _PARALLEL_SOURCE, engine=engine, sequences=sequences, workers=executor
+            )
+            == expected
+        )
+    assert executor.submitted > 1
+
+
+def test_worker_processes():
+    expected = _parser.lua_to_python(_PARALLEL_SOURCE)
+    assert _parser.lua_to_python(_PARALLEL_SOURCE.encode(), workers=2) == expected
+
+
+def test_workers_not_split():
+    # fruit may refer to units, so neither is parsed by the workers.
+    with _CountingExecutor(2) as executor:
+        namespace = _parser.lua_to_python(_SEQUENCE_SOURCE, workers=executor)
+    assert namespace == _parser.lua_to_python(_SEQUENCE_SOURCE)
+    assert executor.submitted == 0
+
+
+def test_workers_errors():
+    with pytest.raises(ValueError):
+        _parser.lua_to_python(_PARALLEL_SOURCE, workers=2, lazy=True)
+    with pytest.raises(ValueError):
+        _parser.lua_to_python(_PARALLEL_SOURCE, workers=0)
+    source = 't = {["a"] = {f(1)}, ["b"] = {2}}'
+    with _CountingExecutor(2) as executor:
+        with pytest.raises(_parser.UnsupportedSyntaxError):
+            _parser.lua_to_python(source, engine="fast", workers=executor)
+        with pytest.raises(_parser.NestingTooDeepError):
+            _parser.lua_to_python(source, max_depth=1, workers=executor)
+
+
+_MANY_SOURCES = [
+    _PARALLEL_SOURCE,
+    'a = {"x", "y"}'.encode(),
+    "a = {",
+    memoryview(b"a = 1 b = 2"),
+    "t = {f(1)}",
+]
+
+
+def _check_many_results(results):
+    assert [result.index for result in results] == list(range(len(_MANY_SOURCES)))
+    assert results[0].namespace == _parser.lua_to_python(
+        _PARALLEL_SOURCE, sequences="list"
+    )
+    assert results[1] == (1, {"a": ["x", "y"]}, None)
+    assert results[2].namespace is None
+    assert isinstance(results[2].error, _parser.UnsupportedSyntaxError)
+    assert results[3] == (3, {"a": 1, "b": 2}, None)
+    assert isinstance(results[4].error, _parser.UnsupportedSyntaxError)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_lua_to_python_many(workers):
+    results = _parser.lua_to_python_many(
+        _MANY_SOURCES, workers=workers, engine="fast", sequences="list"
+    )
+    _check_many_results(list(results))
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 10])
+def test_lua_to_python_many_unordered(chunksize):
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        results = _parser.lua_to_python_many(
+            iter(_MANY_SOURCES),
+            workers=executor,
+            chunksize=chunksize,
+            ordered=False,
+            engine="fast",
+            sequences="list",
+        )
+        _check_many_results(sorted(results))
+
+
+def test_lua_to_python_many_errors():
+    # Raised by the call, before any result is requested.
+    with pytest.raises(ValueError):
+        _parser.lua_to_python_many(_MANY_SOURCES, lazy=True)
+    with pytest.raises(ValueError):
+        _parser.lua_to_python_many(_MANY_SOURCES, engine="lua")
+    with pytest.raises(ValueError):
+        _parser.lua_to_python_many(_MANY_SOURCES, chunksize=0)
+    with pytest.raises(ValueError):
+        _parser.lua_to_python_many(_MANY_SOURCES, workers=0)
+    results = _parser.lua_to_python_many(
+        _MANY_SOURCES, workers=1, engine="fast", sequences="list", lazy=False
+    )
+    _check_many_results(list(results))
+
+
+@pytest.mark.parametrize("convert", [str, str.encode])
+def test_spans(convert):
+    source = convert(_SELECT_SOURCE)
+    spans = {}
+    namespace = _parser.lua_to_python(
+        source,
+        select=["version", "mission.coalition.*.country.1.name", "mission.trig"],
+        spans=spans,
+    )
+    assert list(spans) == [
+        ("version",),
+        ("mission", "coalition", "blue", "country", 1, "name"),
+        ("mission", "coalition", "red", "country", 1, "name"),
+        ("mission", "trig"),
+    ]
+    assert [source[start:end] for start, end in spans.values()] == [
+        convert(text)
+        for text in [
+            "12",
+            '"USA"',
+            '"Russia"',
+            '{["func"] = {[1] = "if x then y() end -- }}}"}}',
+        ]
+    ]
+    assert (
+        namespace["mission"]["trig"]
+        == _parser.lua_to_python(_SELECT_SOURCE)["mission"]["trig"]
+    )
+
+
+def test_spans_errors():
+    with pytest.raises(ValueError):
+        _parser.lua_to_python(_SELECT_SOURCE, spans={})
+    with pytest.raises(ValueError):
+        _parser.lua_to_python(
+            _SELECT_SOURCE, select=["version"], engine="antlr", spans={}
+        )
+    with pytest.raises(_parser.UnsupportedSyntaxError):
+        _parser.lua_to_python("t = {f(1)}", select=["t"], spans={})
+
+
+@dataclasses.dataclass(slots=True)
+class _Country:
+    name: str
+    country_id: int = dataclasses.field(metadata={"lua_key": "id"})
+
+
+@dataclasses.dataclass(slots=True)
+class _Coalition:
+    name: str
+    countries: tuple[_Country, ...] = dataclasses.field(
+        default=(), metadata={"lua_key": "country"}
+    )
+    bullseye: _Country | None = None
+
+
+@dataclasses.dataclass
+class _Node:
+    value: int
+    children: dict[str, "_Node"] = dataclasses.field(default_factory=dict)
+
+
+def test_schema(lua_to_python):
+    schema = _parser.Schema({"mission.coalition": dict[str, _Coalition]})
+    assert lua_to_python(_SELECT_SOURCE, schema=schema) == {
+        "mission": {
+            "coalition": {
+                "blue": _Coalition(
+                    "blue", (_Country("USA", 2), _Country("UK", 4)), None
+                ),
+                "red": _Coalition("red", (_Country("Russia", 0),), None),
+            }
+        }
+    }
+
+
+def test_schema_nested(lua_to_python):
+    source = """
+    t = {["value"] = 1, ["children"] = {["a"] = {["value"] = 2, ["x"] = {}}}}
+    s = {[1] = {["value"] = 3}, "positional"}
+    """
+    namespace = lua_to_python(source, schema={"t": _Node, "s": list[str | None]})
+    assert namespace == {
+        "t": _Node(1, {"a": _Node(2)}),
+        "s": ["positional"],
+    }
+
+
+def test_schema_errors():
+    with pytest.raises(TypeError):
+        _parser.lua_to_python('t = {["value"] = 1}', schema={"t": _Country})
+    with pytest.raises(ValueError):
+        _parser.lua_to_python(_SELECT_SOURCE, schema={"t": _Node}, select=["t"])
+    with pytest.raises(ValueError):
+        _parser.Schema({"t": _Node, "t.children": dict[str, _Node]})
+    with pytest.raises(ValueError):
+        _parser.lua_to_python(
+            't = {["a"] = {["value"] = 1}}',
+            schema={"t.*": _Node, "t.a": _Country},
+        )
+
+
+@pytest.mark.parametrize("engine", ["fast", "antlr"])
+def test_query(engine):
+    query = _parser.Query("mission.coalition.*.country[*].name")
+    expected = [
+        (("mission", "coalition", "blue", "country", 1, "name"), "USA"),
+        (("mission", "coalition", "blue", "country", 2, "name"), "UK"),
+        (("mission", "coalition", "red", "country", 1, "name"), "Russia"),
+    ]
+    assert list(query.find(_SELECT_SOURCE, engine=engine)) == expected
+    assert list(query.find_in(_parser.lua_to_python(_SELECT_SOURCE))) == expected
+    lazy = _parser.lua_to_python(_SELECT_SOURCE, lazy=True)
+    assert list(query.find_in(lazy)) == expected
+    assert repr(lazy["mission"]["trig"]).startswith("<LazyLuaTable")
+
+
+def test_query_syntax():
+    source = 't = {["a b"] = {10, 20, {["x"] = 30}}}'
+    namespace = _parser.lua_to_python(source, sequences="list")
+    for expression, expected in [
+        ('t["a b"][2]', [(("t", "a b", 2), 20)]),
+        ('t["a b"].3.x', [(("t", "a b", 3, "x"), 30)]),
+        (
+            "*[*][*]",
+            [
+                (("t", "a b", 1), 10),
+                (("t", "a b", 2), 20),
+                (("t", "a b", 3), {"x": 30}),
+            ],
+        ),
+        ("t.c", []),
+    ]:
+        query = _parser.Query(expression)
+        assert list(query.find(source)) == expected
+        # Lists are indexed from 1, like the tables that they came from.
+        assert list(query.find_in(namespace)) == expected
+    for expression in ["", ".t", "t..a", "t a", "1.t", "t.[1]", "t[", 't["*"]']:
+        with pytest.raises(ValueError):
+            _parser.Query(expression)
+
+
+def test_negative_zero(lua_to_python):
+    namespace = lua_to_python("a = -0 b = {-0} c = -0.0 d = - -0")
+    assert [math.copysign(1, namespace[name]) for name in "acd"] == [-1, -1, 1]
+    assert math.copysign(1, namespace["b"][1]) == -1
+
+
+@pytest.mark.parametrize("convert", [bytes, bytearray, memoryview])
+def test_bytes_input(lua_to_python, convert):
+    source = _SELECT_SOURCE + '\ns = "caf\\195\\169 \\255"\nu = "café"'
+    expected = lua_to_python(source)
+    assert lua_to_python(convert(source.encode())) == expected
+    assert expected["s"] == expected["u"] + " \udcff"
+
+
+def test_invalid_utf8_with_fallback():
+    source = b'a = "caf\xc3\xa9 \xff"'
+    expected = {"a": "caf\xe9 \udcff"}
+    assert _parser.lua_to_python(source) == expected
+    assert _parser.lua_to_python(source + b" function f() end") == expected
+    assert _parser.lua_to_python(source, engine="antlr") == expected
+
+
+def test_bytes_input_lazy_and_select():
+    source = _SELECT_SOURCE.encode()
+    assert _parser.lua_to_python(source, lazy=True) == _parser.lua_to_python(
+        _SELECT_SOURCE
+    )
+    assert _parser.lua_to_python(source, select=["mission.theatre"]) == {
+        "mission": {"theatre": "Caucasus"}
+    }
+
+
+def _build_from_events(events):
+    namespace = {}
+    for event in events:
+        path = event[1]
+        parent = namespace
+        for key in path[:-1]:
+            parent = parent[key]
+        if event[0] == _parser.START_TABLE:
+            parent[path[-1]] = {}
+        elif event[0] == _parser.SCALAR:
+            parent[path[-1]] = event[2]
+    return namespace
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_iterparse(chunk_size):
+    source = (
+        _SELECT_SOURCE
+        + """
+        --[==[ a long
+        comment ]==]
+        text = "Привет \\"мир\\""
+        gravity = -9.8
+        fruit = {[0] = "ape", "banana", [1] = "bat", ["x"] = {1, 2}}
+        """
+    )
+    events = list(
+        _parser.iterparse_lua(io.BytesIO(source.encode("utf-8")), chunk_size)
+    )
+    assert events[:3] == [
+        ("scalar", ("version",), 12),
+        ("start_table", ("mission",)),
+        ("scalar", ("mission", "sortie"), "DictKey_sortie_5"),
+    ]
+    assert events[-1] == ("end_table", ("fruit",))
+    assert _build_from_events(events) == _parser.lua_to_python(source)
+
+
+def test_iterparse_line_comment_with_long_bracket():
+    # "--[[" inside a line comment does not start a long comment, so the
+    # reader must not buffer the rest of the file looking for its end.
+    source = "-- see --[[ the notes\nt = {" + "1, " * 100_000 + "}\n"
+    f = io.BytesIO(source.encode("ascii"))
+    events = _parser.iterparse_lua(f, chunk_size=1024)
+    assert next(events) == ("start_table", ("t",))
+    assert next(events) == ("scalar", ("t", 1), 1)
+    assert f.tell() <= 2 * 1024
+    assert sum(1 for _ in events) == 100_000
+
+
+def test_iterparse_text_file():
+    events = list(_parser.iterparse_lua(io.StringIO('t = {["a"] = {true}}')))
+    assert events == [
+        ("start_table", ("t",)),
+        ("start_table", ("t", "a")),
+        ("scalar", ("t", "a", 1), True),
+        ("end_table", ("t", "a")),
+        ("end_table", ("t",)),
+    ]
+
+
+def test_iterparse_unsupported_syntax():
+    with pytest.raises(_parser.UnsupportedSyntaxError):
+        list(_parser.iterparse_lua(io.StringIO("t = {x + 1}")))
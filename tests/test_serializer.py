@@ -0,0 +1,185 @@
+import io
+import math
+import os.path
+import zipfile
+
+import pytest
+
+from dcsmissionpy import _parser, _serializer
+
+_MIZ_PATH = os.path.join(os.path.dirname(__file__), "harpoon-radar.miz")
+
+
+@pytest.mark.parametrize(
+    "member",
+    [
+        "mission",
+        "options",
+        "warehouses",
+        "l10n/DEFAULT/dictionary",
+        "l10n/DEFAULT/mapResource",
+    ],
+)
+def test_round_trip(member):
+    with zipfile.ZipFile(_MIZ_PATH) as z:
+        source = z.read(member)
+    namespace = _parser.lua_to_python(source)
+    assert _serializer.python_to_lua(namespace).encode("utf-8") == source
+
+
+def test_layout():
+    namespace = {
+        "version": 12,
+        "t": {"name": "a", 1: {"x": 1.5, "y": -0.0}, "empty": {}, "ok": True},
+    }
+    assert _serializer.python_to_lua(namespace) == (
+        "version = 12\n"
+        "t = \n"
+        "{\n"
+        '    ["name"] = "a",\n'
+        "    [1] = \n"
+        "    {\n"
+        '        ["x"] = 1.5,\n'
+        '        ["y"] = -0,\n'
+        "    }, -- end of [1]\n"
+        '    ["empty"] = \n'
+        "    {\n"
+        '    }, -- end of ["empty"]\n'
+        '    ["ok"] = true,\n'
+        "} -- end of t\n"
+    )
+
+
+def test_strings():
+    values = ['a "quoted" \\ path', "two\nlines\r\n", "nul\0" + "1", "café \udcff"]
+    namespace = {"t": {value: value for value in values}}
+    f = io.BytesIO()
+    _serializer.write_lua(namespace, f)
+    assert _parser.lua_to_python(f.getvalue()) == namespace
+    source = _serializer.python_to_lua(namespace)
+    assert _parser.lua_to_python(source, engine="antlr") == namespace
+
+
+def test_newline_in_table_key():
+    namespace = {"t": {"a\nb": {1: 2}, "c\r\n": {"d\n": {}}}}
+    source = _serializer.python_to_lua(namespace)
+    assert '}, -- end of ["a\\nb"]\n' in source
+    for engine in ["fast", "antlr"]:
+        assert _parser.lua_to_python(source, engine=engine) == namespace
+    patched = _serializer.patch_lua(source, {"t.c\r\n": {"e\n": {1: 3}}})
+    assert _parser.lua_to_python(patched, engine="fast") == {
+        "t": {"a\nb": {1: 2}, "c\r\n": {"e\n": {1: 3}}}
+    }
+
+
+def test_sequences():
+    namespace = {
+        "t": {"list": ["a", "b"], "tuple": (1, 2), "lua": _parser.LuaSequence([3])}
+    }
+    assert _parser.lua_to_python(_serializer.python_to_lua(namespace)) == {
+        "t": {"list": {1: "a", 2: "b"}, "tuple": {1: 1, 2: 2}, "lua": {1: 3}}
+    }
+
+
+def test_write_text_file():
+    namespace = {"t": {i: {"x": float(i)} for i in range(5000)}}
+    f = io.StringIO()
+    _serializer.write_lua(namespace, f)
+    assert f.getvalue() == _serializer.python_to_lua(namespace)
+    assert len(list(_serializer.iter_python_to_lua(namespace))) > 1
+
+
+def test_deeply_nested_tables():
+    table = {}
+    namespace = {"t": table}
+    for _ in range(2000):
+        table["a"] = table = {}
+    assert _parser.lua_to_python(_serializer.python_to_lua(namespace), max_depth=2001)
+
+
+@pytest.mark.parametrize(
+    "namespace, error",
+    [
+        ({"t": math.nan}, ValueError),
+        ({"t": {None: 1}}, ValueError),
+        ({"not a name": 1}, ValueError),
+        ({"t": {"x": object()}}, TypeError),
+    ],
+)
+def test_errors(namespace, error):
+    with pytest.raises(error):
+        _serializer.python_to_lua(namespace)
+
+
+_PATCH_SOURCE = """\
+version = 12
+mission = 
+{
+    ["weather"] = 
+    {
+        ["qnh"] = 760, -- hPa? no, mmHg
+        ["wind"] = {["speed"] = -0,   ["dir"] = 90},
+    }, -- end of ["weather"]
+    ["units"] = 
+    {
+        [1] = {["skill"] = "Average", ["name"] = "a"},
+        [2] = {["skill"] = "High", ["name"] = "b"},
+    }, -- end of ["units"]
+} -- end of mission
+"""
+
+
+@pytest.mark.parametrize("convert", [str, str.encode, lambda s: memoryview(s.encode())])
+def test_patch_lua(convert):
+    patched = _serializer.patch_lua(
+        convert(_PATCH_SOURCE),
+        {
+            "version": 13,
+            "mission.weather.qnh": 750,
+            ("mission", "weather", "wind", "dir"): 'a "b"',
+            "mission.units.*.skill": "Excellent",
+            "mission.units.2.skill": "Client",
+        },
+    )
+    if not isinstance(patched, str):
+        patched = patched.decode()
+    assert patched == (
+        _PATCH_SOURCE.replace("version = 12", "version = 13")
+        .replace("760", "750")
+        .replace("90}", '"a \\"b\\""}')
+        .replace('"Average"', '"Excellent"')
+        .replace('"High"', '"Client"')
+    )
+
+
+def test_patch_lua_table():
+    patched = _serializer.patch_lua(
+        _PATCH_SOURCE, {"mission.weather.wind": {"speed": 1, "dir": [1, 2]}}
+    )
+    assert patched == _PATCH_SOURCE.replace(
+        '{["speed"] = -0,   ["dir"] = 90}',
+        "{\n"
+        '            ["speed"] = 1,\n'
+        '            ["dir"] = \n'
+        "            {\n"
+        "                [1] = 1,\n"
+        "                [2] = 2,\n"
+        '            }, -- end of ["dir"]\n'
+        "        }",
+    )
+    namespace = _parser.lua_to_python(patched)
+    assert namespace["mission"]["weather"]["wind"] == {"speed": 1, "dir": {1: 1, 2: 2}}
+
+
+@pytest.mark.parametrize(
+    "changes, error",
+    [
+        ({"mission.weather.fog": 1}, KeyError),
+        ({"mission.weather": {}, "mission.weather.qnh": 1}, ValueError),
+        ({"mission.*.qnh": 1, "mission.weather": {}}, ValueError),
+        ({"mission.weather.qnh": 1, "*.weather": {}}, ValueError),
+    ],
+)
+def test_patch_lua_errors(changes, error):
+    with pytest.raises(error):
+        _serializer.patch_lua(_PATCH_SOURCE, changes)